@@ -0,0 +1,155 @@
+"""
+Plexmuse command line
+
+Generates playlists for a JSONL file of prompts without starting the API
+server, e.g. for nightly cron jobs:
+
+    python -m app.cli generate prompts.jsonl --concurrency 4 --output results.jsonl
+
+Each input line is a PlaylistRequest object such as {"prompt": "Focus music"}.
+Results are written as JSONL in completion order as soon as each prompt
+finishes, followed by a summary of timings and match rates on stderr.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import sys
+import time
+from typing import IO, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from app.config import build_llm_service, build_plex_service
+from app.models import BatchPlaylistResult, PlaylistRequest
+from app.pipeline import generate_playlist
+from app.services.llm_service import LLMService
+from app.services.plex_service import PlexService
+
+logger = logging.getLogger(__name__)
+
+
+def read_requests(path: str) -> List[Tuple[str, Optional[PlaylistRequest], Optional[str]]]:
+    """Parse a JSONL file of requests into (prompt, request, error) rows, skipping blank lines"""
+    rows = []
+    # stdin is read but left open, like stdout for the results
+    with contextlib.nullcontext(sys.stdin) if path == "-" else open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                rows.append((str(data.get("prompt", "")), PlaylistRequest(**data), None))
+            except (ValueError, AttributeError, TypeError, ValidationError) as e:
+                rows.append(("", None, f"Invalid request on line {number}: {e}"))
+    return rows
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Get the nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def generate(
+    plex_service: PlexService,
+    llm_service: LLMService,
+    rows: List[Tuple[str, Optional[PlaylistRequest], Optional[str]]],
+    output: IO,
+    concurrency: int = 4,
+) -> dict:
+    """Run the pipeline for every request, writing each result as soon as it finishes, and summarise the run"""
+    slots = asyncio.Semaphore(concurrency)
+    durations: List[float] = []
+
+    async def run(index: int, prompt: str, request: Optional[PlaylistRequest], error: Optional[str]):
+        result = BatchPlaylistResult(index=index, prompt=prompt, error=error)
+        if request is None:
+            return result, 0.0
+        async with slots:
+            started = time.perf_counter()
+            try:
+                result.playlist = await generate_playlist(plex_service, llm_service, request)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Prompt %d failed: %s", index, str(e))
+                result.error = str(e)
+            return result, time.perf_counter() - started
+
+    started = time.perf_counter()
+    succeeded = 0
+    for task in asyncio.as_completed([run(i, *row) for i, row in enumerate(rows)]):
+        result, seconds = await task
+        if result.playlist is not None:
+            succeeded += 1
+            durations.append(seconds)
+        output.write(json.dumps({**result.model_dump(), "seconds": round(seconds, 3)}) + "\n")
+        output.flush()
+
+    return {
+        "prompts": len(rows),
+        "succeeded": succeeded,
+        "failed": len(rows) - succeeded,
+        "seconds": round(time.perf_counter() - started, 3),
+        "prompt_seconds": {
+            "mean": round(sum(durations) / len(durations), 3) if durations else 0.0,
+            "p95": round(percentile(durations, 0.95), 3) if durations else 0.0,
+            "max": round(max(durations), 3) if durations else 0.0,
+        },
+        "match_stats": plex_service.get_match_stats(),
+        "match_memo": plex_service.match_memo.stats(),
+        "prefetch": plex_service.get_prefetch_stats(),
+        "llm_usage": llm_service.get_usage_stats(),
+    }
+
+
+def run_generate(args: argparse.Namespace) -> int:
+    """Load the library once, generate every playlist and print the summary"""
+    rows = read_requests(args.prompts)
+    plex_service = build_plex_service(catalog_dir=args.catalog_dir)
+    llm_service = build_llm_service()
+
+    started = time.perf_counter()
+    plex_service.match_memo.load()
+    plex_service.initialize()
+    load_seconds = time.perf_counter() - started
+
+    with contextlib.ExitStack() as stack:
+        stack.callback(plex_service.match_memo.save, force=True)
+        output = sys.stdout if args.output == "-" else stack.enter_context(open(args.output, "w", encoding="utf-8"))
+        summary = asyncio.run(generate(plex_service, llm_service, rows, output, concurrency=args.concurrency))
+
+    summary["library_seconds"] = round(load_seconds, 3)
+    summary["library_version"] = plex_service.catalog_version
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Parse the command line and run the selected command"""
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Generate Plex playlists without the API")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log progress to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="Generate a playlist for each prompt in a JSONL file")
+    generate_parser.add_argument("prompts", help="JSONL file of playlist requests, or - for stdin")
+    generate_parser.add_argument("-o", "--output", default="-", help="JSONL file for the results (default: stdout)")
+    generate_parser.add_argument("-c", "--concurrency", type=int, default=4, help="Prompts generated at once")
+    generate_parser.add_argument(
+        "--catalog-dir",
+        help="Reuse the artist catalog snapshot in this directory instead of scanning Plex (default: "
+        "PLEXMUSE_CATALOG_DIR)",
+    )
+
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+    load_dotenv()
+    return run_generate(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+Service configuration
+
+This module builds the Plex and LLM services from environment variables, so
+the API server and the command-line tools are configured the same way.
+"""
+
+import json
+import os
+from typing import Optional
+
+from .services.catalog_store import CatalogStore
+from .services.llm_service import LLMService
+from .services.match_memo import MatchMemo
+from .services.plex_service import PlexService
+from .services.rate_limiter import ConcurrencyLimiter, RateLimiter
+
+
+def build_plex_service(catalog_dir: Optional[str] = None) -> PlexService:
+    """Build the PlexService, sharing the catalog through catalog_dir or PLEXMUSE_CATALOG_DIR if set"""
+    catalog_dir = catalog_dir or os.getenv("PLEXMUSE_CATALOG_DIR")
+    return PlexService(
+        base_url=os.getenv("PLEX_BASE_URL"),
+        token=os.getenv("PLEX_TOKEN"),
+        album_cache_bytes=int(os.getenv("PLEX_ALBUM_CACHE_MB", "64")) * 1024 * 1024,
+        album_cache_ttl=float(os.getenv("PLEX_ALBUM_CACHE_TTL", "3600")),
+        plex_limiter=ConcurrencyLimiter(
+            max_concurrent=int(os.getenv("PLEX_MAX_CONCURRENCY", "8")),
+            max_wait=float(os.getenv("PLEX_MAX_WAIT", "30")),
+            name="Plex",
+        ),
+        # Workers sharing a catalog directory scan Plex once between them
+        catalog_store=CatalogStore(catalog_dir) if catalog_dir else None,
+        match_memo=MatchMemo(
+            path=os.getenv("PLEXMUSE_MATCH_MEMO_FILE") or None,
+            miss_ttl=float(os.getenv("PLEXMUSE_MATCH_MISS_TTL", "21600")),
+        ),
+    )
+
+
+def build_llm_service() -> LLMService:
+    """Build the LLMService with the provider rate limits"""
+    return LLMService(
+        rate_limiter=RateLimiter(
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")),
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+            max_wait=float(os.getenv("LLM_MAX_WAIT", "20")),
+            overrides=json.loads(os.getenv("LLM_RATE_LIMITS", "{}")),
+        )
+    )
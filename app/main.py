@@ -2,21 +2,42 @@
 Plexmuse API with initialization
 """
 
+import asyncio
 import logging
+import math
 import os
-from contextlib import asynccontextmanager
-from typing import List
+import tracemalloc
+from contextlib import asynccontextmanager, suppress
+from typing import List, Literal, Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.models import Artist, PlaylistRequest, PlaylistResponse, Track
+from app.models import (
+    Artist,
+    BatchPlaylistRequest,
+    BatchPlaylistResponse,
+    Genre,
+    PlaylistRequest,
+    PlaylistResponse,
+    ProfilingSettings,
+    Schedule,
+    ScheduleRequest,
+)
+from app.pipeline import (
+    NoMatchingArtistsError,
+    generate_playlist,
+    generate_playlists_batch,
+)
 
-from .services.llm_service import LLMService
-from .services.plex_service import PlexService
+from .config import build_llm_service, build_plex_service
+from .services.plex_service import NotAPlaylistError, PlaylistNotFoundError
+from .services.profiler import TRACEMALLOC_FRAMES, RequestProfiler, memory_snapshot
+from .services.rate_limiter import AdmissionController, OverloadedError
+from .services.schedule_service import ScheduleBusyError, ScheduleService
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -24,17 +45,91 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 # Initialize services
-plex_service = PlexService(base_url=os.getenv("PLEX_BASE_URL"), token=os.getenv("PLEX_TOKEN"))
-llm_service = LLMService()
+plex_service = build_plex_service()
+llm_service = build_llm_service()
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("PLEXMUSE_MAX_CONCURRENT_REQUESTS", "4")),
+    max_queue=int(os.getenv("PLEXMUSE_MAX_QUEUED_REQUESTS", "16")),
+    queue_timeout=float(os.getenv("PLEXMUSE_QUEUE_TIMEOUT", "30")),
+)
+
+profiler = RequestProfiler(
+    sample_rate=float(os.getenv("PLEXMUSE_PROFILE_SAMPLE_RATE", "0")),
+    slow_threshold=float(os.getenv("PLEXMUSE_SLOW_REQUEST_SECONDS", "30")),
+)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Allow admin endpoints only when PLEXMUSE_ADMIN_TOKEN is set and matches the X-Admin-Token header"""
+    admin_token = os.getenv("PLEXMUSE_ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Admin API is disabled")
+    if x_admin_token != admin_token:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def overloaded_response(error: OverloadedError) -> HTTPException:
+    """Build a 429 response telling the client when to retry"""
+    return HTTPException(
+        status_code=429, detail=str(error), headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
+
+
+async def run_scheduled_playlist(request: PlaylistRequest, fingerprint: str) -> PlaylistResponse:
+    """Regenerate a scheduled playlist, reloading the artist cache first if the library changed"""
+    if fingerprint != plex_service.library_fingerprint:
+        await asyncio.to_thread(plex_service.initialize)
+    async with admission.admit():
+        return await generate_playlist(plex_service, llm_service, request)
+
+
+def get_library_fingerprint() -> str:
+    """Fingerprint the Plex music libraries for the scheduler"""
+    return plex_service.get_library_fingerprint()
+
+
+schedule_service = ScheduleService(
+    path=os.getenv("PLEXMUSE_SCHEDULES_FILE", "schedules.json"),
+    run_playlist=run_scheduled_playlist,
+    get_fingerprint=get_library_fingerprint,
+)
+
+
+async def load_library():
+    """Load the artist cache in the background, retrying until Plex is reachable, then start the scheduler"""
+    retry_seconds = float(os.getenv("PLEXMUSE_STARTUP_RETRY_SECONDS", "30"))
+    while True:
+        try:
+            await asyncio.to_thread(plex_service.initialize)
+            break
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error("Library load failed, retrying in %.0fs: %s", retry_seconds, str(e))
+            await asyncio.sleep(retry_seconds)
+    schedule_service.start()
 
 
 @asynccontextmanager
 async def lifespan(app_context: FastAPI):  # pylint: disable=unused-argument
     """Lifespan event handler for service initialization and cleanup"""
-    # Initialize services on startup
-    plex_service.initialize()
+    # Trace from before the library load so the caches' allocations show up in /admin/memory
+    if os.getenv("PLEXMUSE_TRACEMALLOC") == "1":
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    # The library loads in the background so the server accepts connections immediately; see /ready
+    plex_service.match_memo.load()
+    schedule_service.load()
+    loader = asyncio.create_task(load_library())
     yield
-    # Cleanup on shutdown (if needed in the future)
+    loader.cancel()
+    with suppress(asyncio.CancelledError):
+        await loader
+    await schedule_service.stop()
+    plex_service.match_memo.save(force=True)
+
+
+def require_ready():
+    """Reject requests that need the artist cache until the first library load has finished"""
+    if not plex_service.is_ready():
+        raise HTTPException(status_code=503, detail="Library is still loading", headers={"Retry-After": "5"})
 
 
 app = FastAPI(
@@ -79,52 +174,142 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "cache_size": plex_service.get_cache_size()}
+    return {
+        "status": "healthy",
+        "cache_size": plex_service.get_cache_size(),
+        "album_cache": plex_service.get_album_cache_stats(),
+        "match_stats": plex_service.get_match_stats(),
+        "match_memo": plex_service.match_memo.stats(),
+        "prefetch": plex_service.get_prefetch_stats(),
+        "llm_usage": llm_service.get_usage_stats(),
+        "admission": admission.stats(),
+    }
+
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: 503 until the artist cache has loaded, with the progress of the library load"""
+    progress = plex_service.get_load_progress()
+    if not progress["ready"]:
+        response.status_code = 503
+    return progress
 
-@app.get("/artists", response_model=List[Artist])
-async def get_artists():
-    """Get all artists from the Plex music library"""
+
+@app.get("/artists", response_model=List[Artist], dependencies=[Depends(require_ready)])
+async def get_artists(genre: Optional[List[str]] = Query(default=None), genre_match: Literal["any", "all"] = "any"):
+    """Get all artists from the Plex music library, optionally only those tagged with any or all of the genres"""
+    if genre:
+        return plex_service.get_artists_by_genres(genre, genre_match)
     return plex_service.get_all_artists()
 
 
-@app.post("/recommendations", response_model=PlaylistResponse)
-async def create_recommendations(request: PlaylistRequest):
-    """Create playlist recommendations"""
+@app.get("/genres", response_model=List[Genre], dependencies=[Depends(require_ready)])
+async def get_genres():
+    """Get every genre in the library with its number of artists"""
+    return plex_service.get_genres()
+
+
+@app.post("/recommendations", response_model=PlaylistResponse, dependencies=[Depends(require_ready)])
+async def create_recommendations(
+    request: PlaylistRequest, response: Response, x_plexmuse_profile: Optional[str] = Header(default=None)
+):
+    """Create playlist recommendations; send X-Plexmuse-Profile: 1 to profile the request"""
     try:
-        # Step 1: Get artist recommendations
-        artists = plex_service.get_all_artists()
-        recommended_artists = llm_service.get_artist_recommendations(
-            prompt=request.prompt, artists=artists, model=request.model
-        )
-
-        # Step 2: Get all recommended artists' albums in one call
-        artist_albums = plex_service.get_artists_albums_bulk(recommended_artists)
-
-        # Step 3: Get track recommendations
-        track_recommendations = llm_service.get_track_recommendations(
-            prompt=request.prompt,
-            artist_tracks=artist_albums,
-            model=request.model,
-            min_tracks=request.min_tracks,
-            max_tracks=request.max_tracks,
-        )
-
-        # Step 4: Generate playlist name
-        playlist_name = llm_service.generate_playlist_name(prompt=request.prompt, model=request.model)
-
-        # Step 5: Create the playlist
-        playlist = plex_service.create_curated_playlist(
-            name=playlist_name,
-            track_recommendations=track_recommendations,
-        )
-        return PlaylistResponse(
-            name=playlist.title,
-            track_count=len(track_recommendations),
-            tracks=[Track(artist=rec["artist"], title=rec["title"]) for rec in track_recommendations],
-            id=str(playlist.ratingKey) if hasattr(playlist, "ratingKey") else None,
-            machine_identifier=plex_service.machine_identifier,
-        )
+        with profiler.trace("recommendations", force_profile=x_plexmuse_profile == "1") as trace:
+            response.headers["X-Plexmuse-Trace-Id"] = trace.id
+            async with admission.admit():
+                return await generate_playlist(plex_service, llm_service, request)
+    except OverloadedError as e:
+        logger.warning("Rejecting playlist request: %s", str(e))
+        raise overloaded_response(e) from e
+    except PlaylistNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except (NotAPlaylistError, NoMatchingArtistsError) as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
     except Exception as e:
         logger.error("Error creating playlist: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post("/recommendations/batch", response_model=BatchPlaylistResponse, dependencies=[Depends(require_ready)])
+async def create_recommendations_batch(request: BatchPlaylistRequest):
+    """Create many playlists, sharing library context and album lookups between prompts"""
+    try:
+        # A batch takes admission capacity in proportion to its size rather than a single slot
+        async with admission.admit(weight=len(request.requests)):
+            results = await generate_playlists_batch(plex_service, llm_service, request.requests, request.concurrency)
+    except OverloadedError as e:
+        logger.warning("Rejecting batch request: %s", str(e))
+        raise overloaded_response(e) from e
+    return BatchPlaylistResponse(results=results)
+
+
+@app.get("/schedules", response_model=List[Schedule])
+async def list_schedules():
+    """Get all auto-refreshing playlist schedules"""
+    return schedule_service.list_schedules()
+
+
+@app.post("/schedules", response_model=Schedule)
+async def create_schedule(request: ScheduleRequest):
+    """Register a playlist that regenerates from the same prompt on a fixed cadence"""
+    return schedule_service.add_schedule(request)
+
+
+@app.delete("/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: str):
+    """Remove a playlist schedule; the Plex playlist itself is kept"""
+    if not schedule_service.remove_schedule(schedule_id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return {"status": "deleted"}
+
+
+@app.post("/schedules/{schedule_id}/run", response_model=Schedule, dependencies=[Depends(require_ready)])
+async def run_schedule(schedule_id: str):
+    """Regenerate a scheduled playlist now, even if the library is unchanged"""
+    schedule = schedule_service.get_schedule(schedule_id)
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    try:
+        return await schedule_service.run_schedule(schedule, force=True)
+    except ScheduleBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+
+@app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling():
+    """Get the profiling settings and the captured slow or sampled requests"""
+    return {**profiler.settings(), "captures": profiler.list_captures()}
+
+
+@app.put("/admin/profiling", dependencies=[Depends(require_admin)])
+async def update_profiling(settings: ProfilingSettings):
+    """Change the profiling sample rate and slow request threshold"""
+    profiler.sample_rate = settings.sample_rate
+    profiler.slow_threshold = settings.slow_threshold
+    return profiler.settings()
+
+
+@app.get("/admin/profiling/{capture_id}", dependencies=[Depends(require_admin)])
+async def get_profiling_capture(capture_id: str):
+    """Get a captured request's span timeline and profile"""
+    capture = profiler.get_capture(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return capture
+
+
+@app.post("/admin/memory/tracing", dependencies=[Depends(require_admin)])
+async def set_memory_tracing(enabled: bool = True):
+    """Start or stop tracemalloc; allocations made before tracing starts are not attributed"""
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return {"tracing": tracemalloc.is_tracing()}
+
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+async def get_memory(limit: int = 20):
+    """Get a tracemalloc snapshot, with the memory held by the Plex caches totalled separately"""
+    return {**memory_snapshot(limit), "album_cache": plex_service.get_album_cache_stats()}
@@ -2,7 +2,7 @@
 Defines the data models used in the application.
 """
 
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -20,8 +20,43 @@ class PlaylistRequest(BaseModel):
 
     prompt: str = Field(..., description="Description of the desired playlist")
     model: str = Field(default="gpt-4", description="AI model to use")
+    artists_model: Optional[str] = Field(
+        default=None, description="Model for artist selection, instead of PLEXMUSE_MODEL_ARTISTS or model"
+    )
+    tracks_model: Optional[str] = Field(
+        default=None, description="Model for track selection, instead of PLEXMUSE_MODEL_TRACKS or model"
+    )
+    name_model: Optional[str] = Field(
+        default=None, description="Model for the playlist name, instead of PLEXMUSE_MODEL_NAME or model"
+    )
     min_tracks: int = Field(default=30, ge=1, le=100, description="Minimum number of tracks")
     max_tracks: int = Field(default=50, ge=1, le=200, description="Maximum number of tracks")
+    playlist_id: Optional[str] = Field(
+        default=None,
+        pattern=r"^\d+$",
+        description="ratingKey of an existing playlist to update in place instead of creating a new one",
+    )
+    ground_tracks: bool = Field(
+        default=False, description="Let the model pick from real track titles instead of recalling them"
+    )
+    mode: Literal["auto", "two_step", "single"] = Field(
+        default="auto",
+        description="'two_step' selects artists then tracks, 'single' picks tracks from all candidate artists in one "
+        "call, 'auto' uses 'single' when the candidate set is small",
+    )
+    genres: Optional[List[str]] = Field(
+        default=None, description="Only consider artists tagged with these genres, before any model call"
+    )
+    genre_match: Literal["any", "all"] = Field(
+        default="any", description="Whether artists need any or all of the requested genres"
+    )
+
+
+class Genre(BaseModel):
+    """A genre and the number of artists tagged with it"""
+
+    name: str
+    count: int
 
 
 class Track(BaseModel):
@@ -39,6 +74,89 @@ class PlaylistResponse(BaseModel):
     tracks: List[Track]
     id: Optional[str] = None
     machine_identifier: Optional[str] = None
+    added: Optional[int] = None
+    removed: Optional[int] = None
+    mode: Optional[str] = None
+    filled: Optional[int] = Field(default=None, description="Tracks added locally to reach min_tracks")
+
+
+class BatchPlaylistRequest(BaseModel):
+    """Request model for generating many playlists at once"""
+
+    requests: List[PlaylistRequest] = Field(..., min_length=1, max_length=100, description="Playlists to generate")
+    concurrency: int = Field(default=4, ge=1, le=16, description="Maximum number of concurrent LLM calls")
+
+
+class BatchPlaylistResult(BaseModel):
+    """Outcome of a single prompt within a batch"""
+
+    index: int
+    prompt: str
+    playlist: Optional[PlaylistResponse] = None
+    error: Optional[str] = None
+
+
+class BatchPlaylistResponse(BaseModel):
+    """Response model for batch playlist generation"""
+
+    results: List[BatchPlaylistResult]
+
+
+class ScheduleRequest(BaseModel):
+    """Request model for registering an auto-refreshing playlist"""
+
+    prompt: str = Field(..., description="Description of the desired playlist")
+    model: str = Field(default="gpt-4", description="AI model to use")
+    artists_model: Optional[str] = Field(
+        default=None, description="Model for artist selection, instead of PLEXMUSE_MODEL_ARTISTS or model"
+    )
+    tracks_model: Optional[str] = Field(
+        default=None, description="Model for track selection, instead of PLEXMUSE_MODEL_TRACKS or model"
+    )
+    name_model: Optional[str] = Field(
+        default=None, description="Model for the playlist name, instead of PLEXMUSE_MODEL_NAME or model"
+    )
+    min_tracks: int = Field(default=30, ge=1, le=100, description="Minimum number of tracks")
+    max_tracks: int = Field(default=50, ge=1, le=200, description="Maximum number of tracks")
+    interval_hours: float = Field(default=24, ge=0.25, description="How often the playlist is regenerated")
+    playlist_id: Optional[str] = Field(
+        default=None,
+        pattern=r"^\d+$",
+        description="ratingKey of the playlist to refresh; created on the first run when omitted",
+    )
+
+
+class Schedule(ScheduleRequest):
+    """A registered auto-refreshing playlist and the state of its last run"""
+
+    id: str
+    next_run_at: float
+    last_run_at: Optional[float] = None
+    last_fingerprint: Optional[str] = None
+    last_status: Optional[str] = None
+    last_error: Optional[str] = None
+
+    def to_playlist_request(self) -> PlaylistRequest:
+        """Build the playlist request for the next run"""
+        return PlaylistRequest(
+            prompt=self.prompt,
+            model=self.model,
+            artists_model=self.artists_model,
+            tracks_model=self.tracks_model,
+            name_model=self.name_model,
+            min_tracks=self.min_tracks,
+            max_tracks=self.max_tracks,
+            playlist_id=self.playlist_id,
+        )
+
+
+class ProfilingSettings(BaseModel):
+    """Admin settings for request profiling"""
+
+    sample_rate: float = Field(default=0.0, ge=0, le=1, description="Fraction of requests profiled with cProfile")
+    slow_threshold: float = Field(
+        default=30.0, ge=0, description="Requests slower than this many seconds are captured with their timeline"
+    )
 
 
 class AIRecommendation(BaseModel):
@@ -0,0 +1,371 @@
+"""
+Playlist generation pipeline shared by the single and batch recommendation endpoints.
+
+Blocking Plex and LLM calls are run in worker threads so that several
+pipelines can make progress concurrently.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from app.models import BatchPlaylistResult, PlaylistRequest, PlaylistResponse, Track
+from app.services.llm_service import LLMService, estimate_tokens
+from app.services.plex_service import PlexService
+from app.services.profiler import traced
+
+logger = logging.getLogger(__name__)
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting when it is used, so values loaded from .env after this module is imported apply"""
+    return int(os.getenv(name, str(default)))
+
+
+class NoMatchingArtistsError(ValueError):
+    """Raised when a request's genre constraints leave no candidate artists"""
+
+
+def stage_model(request: PlaylistRequest, stage: str) -> str:
+    """Pick the model for an LLM stage: the request's override, then PLEXMUSE_MODEL_<STAGE>, then request.model"""
+    return getattr(request, f"{stage}_model") or os.getenv(f"PLEXMUSE_MODEL_{stage.upper()}") or request.model
+
+
+def candidate_artists(plex_service: PlexService, request: PlaylistRequest) -> list:
+    """Get the artists a request may draw from, narrowed locally by its genre constraints"""
+    if not request.genres:
+        return plex_service.get_all_artists()
+    artists = plex_service.get_artists_by_genres(request.genres, request.genre_match)
+    if not artists:
+        raise NoMatchingArtistsError(f"No artists match the genres {', '.join(request.genres)}")
+    logger.info("Genre constraints narrowed the candidates to %d artists", len(artists))
+    return artists
+
+
+def prompt_words(text: str) -> str:
+    """Reduce text to lowercase words separated by single spaces, padded so whole phrases can be matched"""
+    return f" {' '.join(re.findall(r'[a-z0-9]+', text.lower()))} "
+
+
+def mentions(text: str, phrase: str) -> bool:
+    """Check whether text, reduced by prompt_words, contains phrase as whole words"""
+    words = prompt_words(phrase)
+    return bool(words.strip()) and words in text
+
+
+def predict_artists(prompt: str, artists: list, limit: int) -> List[str]:
+    """
+    Guess locally which artists the model will select, from the names and genres the prompt mentions
+
+    Artists named in the prompt rank first, then artists by the number of
+    their genres the prompt mentions. Artists matching nothing are never
+    predicted, so vague prompts cost no prefetching.
+    """
+    if limit <= 0:
+        return []
+    text = prompt_words(prompt)
+    genre_hits: Dict[str, bool] = {}
+    scored = []
+    for artist in artists:
+        score = 10 if mentions(text, artist.name) else 0
+        for genre in artist.genres:
+            if genre not in genre_hits:
+                genre_hits[genre] = mentions(text, genre)
+            score += 1 if genre_hits[genre] else 0
+        if score:
+            scored.append((score, artist.name))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [name for _, name in scored[:limit]]
+
+
+def resolve_mode(request: PlaylistRequest, artists: list) -> str:
+    """
+    Decide between the two-step pipeline and a single track selection call
+
+    Candidate sets over the artist cap always use two_step, so a large library
+    is never fetched and sent whole; fits_single_call then checks the real
+    album context size once it is known.
+    """
+    if request.mode == "two_step":
+        return "two_step"
+    # In "auto" mode, small candidate sets skip the separate artist selection call; the single mode cap applies
+    # even when "single" is requested explicitly
+    if request.mode == "single":
+        limit = env_int("PLEXMUSE_SINGLE_MODE_MAX_ARTISTS", 200)
+    else:
+        limit = env_int("PLEXMUSE_FAST_MODE_MAX_ARTISTS", 25)
+    if len(artists) <= limit:
+        return "single"
+    if request.mode == "single":
+        logger.warning("Single mode requested for %d artists (cap %d), using two_step", len(artists), limit)
+    return "two_step"
+
+
+def fits_single_call(artist_albums: dict) -> bool:
+    """Check that the album context of a single track selection call stays within PLEXMUSE_SINGLE_MODE_MAX_TOKENS"""
+    max_tokens = env_int("PLEXMUSE_SINGLE_MODE_MAX_TOKENS", 12000)
+    return estimate_tokens(LLMService.build_album_context(artist_albums)) <= max_tokens
+
+
+async def call_llm(llm_slots: Optional[asyncio.Semaphore], func, **kwargs):
+    """Run a blocking LLM call in a worker thread, holding one of llm_slots if given"""
+    func = traced(f"llm:{getattr(func, '__name__', 'call')}", func)
+    if llm_slots is None:
+        return await asyncio.to_thread(func, **kwargs)
+    async with llm_slots:
+        return await asyncio.to_thread(func, **kwargs)
+
+
+async def call_plex(func, *args, **kwargs):
+    """Run a blocking Plex call in a worker thread, recorded as a span of the current trace"""
+    return await asyncio.to_thread(traced(f"plex:{getattr(func, '__name__', 'call')}", func), *args, **kwargs)
+
+
+async def select_artists(
+    llm_service: LLMService,
+    request: PlaylistRequest,
+    artists: list,
+    artist_context: Optional[str] = None,
+    llm_slots: Optional[asyncio.Semaphore] = None,
+) -> List[str]:
+    """Ask the LLM which library artists fit the prompt"""
+    return await call_llm(
+        llm_slots,
+        llm_service.get_artist_recommendations,
+        prompt=request.prompt,
+        artists=artists,
+        model=stage_model(request, "artists"),
+        artist_context=artist_context,
+    )
+
+
+async def select_artists_with_prefetch(
+    plex_service: PlexService, llm_service: LLMService, request: PlaylistRequest, artists: list
+) -> List[str]:
+    """
+    Ask the LLM which artists fit the prompt, warming the albums of locally predicted artists meanwhile
+
+    The prefetch stops between artists once the selection returns, so at
+    most one in-flight fetch delays the album fetch that follows.
+    """
+    # Up to PLEXMUSE_PREFETCH_ARTISTS predicted artists are warmed; 0 disables prefetching
+    predicted = predict_artists(request.prompt, artists, env_int("PLEXMUSE_PREFETCH_ARTISTS", 8))
+    if not predicted:
+        return await select_artists(llm_service, request, artists)
+    stop = threading.Event()
+    prefetch = asyncio.create_task(call_plex(plex_service.prefetch_albums, predicted, stop))
+    try:
+        selected = await select_artists(llm_service, request, artists)
+    finally:
+        stop.set()
+        warmed = await prefetch
+    plex_service.record_prefetch(predicted, warmed, selected)
+    return selected
+
+
+async def curate_playlist(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    plex_service: PlexService,
+    llm_service: LLMService,
+    request: PlaylistRequest,
+    artist_albums: dict,
+    mode: Optional[str] = None,
+    llm_slots: Optional[asyncio.Semaphore] = None,
+) -> PlaylistResponse:
+    """
+    Pick tracks from the selected artists' albums and create or update the playlist
+
+    Each LLM call holds its own slot of llm_slots, so the concurrent name call is counted too.
+    """
+    track_call = call_llm(
+        llm_slots,
+        llm_service.get_track_recommendations,
+        prompt=request.prompt,
+        artist_tracks=artist_albums,
+        model=stage_model(request, "tracks"),
+        min_tracks=request.min_tracks,
+        max_tracks=request.max_tracks,
+        grounded=request.ground_tracks,
+    )
+
+    # The name only depends on the prompt, so it is generated alongside track selection
+    added = removed = playlist_name = None
+    if request.playlist_id:
+        track_recommendations = await track_call
+    else:
+        track_recommendations, playlist_name = await asyncio.gather(
+            track_call,
+            call_llm(
+                llm_slots,
+                llm_service.generate_playlist_name,
+                prompt=request.prompt,
+                model=stage_model(request, "name"),
+            ),
+        )
+
+    matched_tracks = await call_plex(plex_service.match_tracks, track_recommendations, raise_if_empty=False)
+
+    # Top up dropped matches from the selected artists' albums instead of asking the model again
+    filled_tracks = []
+    if len(matched_tracks) < request.min_tracks:
+        filled_tracks = await call_plex(
+            plex_service.fill_tracks, matched_tracks, list(artist_albums), request.min_tracks
+        )
+        matched_tracks = matched_tracks + filled_tracks
+    if not matched_tracks:
+        raise ValueError("No tracks could be matched from recommendations")
+
+    # Update the target playlist in place, or create a new one
+    if request.playlist_id:
+        playlist, added, removed = await call_plex(plex_service.sync_playlist, request.playlist_id, matched_tracks)
+    else:
+        playlist = await call_plex(plex_service.create_playlist, playlist_name, matched_tracks)
+
+    # Report the tracks sent to Plex, so recommendations that matched nothing are not counted
+    tracks = [Track(artist=track.grandparentTitle or "", title=track.title) for track in matched_tracks]
+    return PlaylistResponse(
+        name=playlist.title,
+        track_count=len(tracks),
+        tracks=tracks,
+        id=str(playlist.ratingKey) if hasattr(playlist, "ratingKey") else None,
+        machine_identifier=plex_service.machine_identifier,
+        added=added,
+        removed=removed,
+        mode=mode,
+        filled=len(filled_tracks),
+    )
+
+
+async def generate_playlist(
+    plex_service: PlexService, llm_service: LLMService, request: PlaylistRequest
+) -> PlaylistResponse:
+    """Run the full pipeline for a single prompt"""
+    artists = candidate_artists(plex_service, request)
+    mode = resolve_mode(request, artists)
+    if mode == "single":
+        # Every candidate artist goes straight to track selection, saving a model round-trip
+        artist_albums = await call_plex(
+            plex_service.get_artists_albums_bulk,
+            [artist.name for artist in artists],
+            include_tracks=request.ground_tracks,
+        )
+        if fits_single_call(artist_albums):
+            return await curate_playlist(plex_service, llm_service, request, artist_albums, mode=mode)
+        logger.info("Album context too large for a single call, using two_step")
+        mode = "two_step"
+        recommended_artists = await select_artists(llm_service, request, artists)
+        artist_albums = subset_artist_albums(artist_albums, recommended_artists)
+    else:
+        recommended_artists = await select_artists_with_prefetch(plex_service, llm_service, request, artists)
+        artist_albums = await call_plex(
+            plex_service.get_artists_albums_bulk, recommended_artists, include_tracks=request.ground_tracks
+        )
+    return await curate_playlist(plex_service, llm_service, request, artist_albums, mode=mode)
+
+
+def subset_artist_albums(artist_albums: dict, artist_names: List[str]) -> dict:
+    """Pick the entries for artist_names out of a shared get_artists_albums_bulk result"""
+    by_name: Dict[str, str] = {name.lower(): name for name in artist_albums}
+    result = {}
+    for artist_name in artist_names:
+        key = by_name.get(artist_name.lower())
+        if key is not None:
+            result[key] = artist_albums[key]
+    return result
+
+
+async def generate_playlists_batch(  # pylint: disable=too-many-locals
+    plex_service: PlexService, llm_service: LLMService, requests: List[PlaylistRequest], concurrency: int = 4
+) -> List[BatchPlaylistResult]:
+    """
+    Run the pipeline for many prompts while sharing library work between them.
+
+    The artist context is built once, every recommended artist's albums are
+    fetched once for the union of all prompts, and LLM calls run with at most
+    `concurrency` in flight.
+    """
+    llm_slots = asyncio.Semaphore(concurrency)
+    results = [BatchPlaylistResult(index=i, prompt=req.prompt) for i, req in enumerate(requests)]
+
+    artists = plex_service.get_all_artists()
+    artist_context = llm_service.build_artist_context(artists)
+
+    # Genre-constrained prompts get their own, smaller candidate set and context
+    candidates: List[Optional[list]] = []
+    contexts: List[Optional[str]] = []
+    for index, request in enumerate(requests):
+        try:
+            candidates.append(candidate_artists(plex_service, request) if request.genres else artists)
+        except NoMatchingArtistsError as e:
+            results[index].error = str(e)
+            candidates.append(None)
+        contexts.append(None if request.genres else artist_context)
+
+    modes = [resolve_mode(request, candidates[i] or []) for i, request in enumerate(requests)]
+
+    async def run_selection(index: int, request: PlaylistRequest) -> Optional[List[str]]:
+        if candidates[index] is None:
+            return None
+        if modes[index] == "single":
+            return [artist.name for artist in candidates[index]]
+        try:
+            return await select_artists(
+                llm_service, request, candidates[index], artist_context=contexts[index], llm_slots=llm_slots
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error("Batch prompt %d artist selection failed: %s", index, str(e))
+            results[index].error = str(e)
+            return None
+
+    selections = await asyncio.gather(*(run_selection(i, req) for i, req in enumerate(requests)))
+
+    # Fetch each recommended artist's albums once, across all prompts
+    union: Dict[str, str] = {}
+    for selection in selections:
+        for name in selection or []:
+            union.setdefault(name.lower(), name)
+    try:
+        artist_albums = await call_plex(
+            plex_service.get_artists_albums_bulk,
+            list(union.values()),
+            include_tracks=any(request.ground_tracks for request in requests),
+        )
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error("Batch album fetch failed: %s", str(e))
+        for result, selection in zip(results, selections):
+            if selection is not None:
+                result.error = str(e)
+        return results
+
+    async def run_curation(index: int, request: PlaylistRequest, selection: List[str]):
+        try:
+            selected_albums = subset_artist_albums(artist_albums, selection)
+            if modes[index] == "single" and not fits_single_call(selected_albums):
+                # Single-mode selections cover every artist, so the union already holds the albums needed here
+                modes[index] = "two_step"
+                selection = await select_artists(
+                    llm_service, request, candidates[index], artist_context=contexts[index], llm_slots=llm_slots
+                )
+                selected_albums = subset_artist_albums(artist_albums, selection)
+            results[index].playlist = await curate_playlist(
+                plex_service,
+                llm_service,
+                request,
+                selected_albums,
+                mode=modes[index],
+                llm_slots=llm_slots,
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error("Batch prompt %d failed: %s", index, str(e))
+            results[index].error = str(e)
+
+    await asyncio.gather(
+        *(
+            run_curation(i, req, selection)
+            for i, (req, selection) in enumerate(zip(requests, selections))
+            if selection is not None
+        )
+    )
+    return results
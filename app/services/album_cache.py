@@ -0,0 +1,119 @@
+"""
+Album Cache
+
+This module provides the AlbumCache class, a memory-bounded LRU cache with TTL
+for per-artist album and track listings fetched from Plex.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def estimate_albums_size(albums: list) -> int:
+    """
+    Measure the memory held by a cached album listing in bytes.
+
+    Albums are {"name", "year", "tracks"} dicts whose tracks are small
+    tuples of strings, so summing sys.getsizeof over the containers and
+    their fields accounts for everything the entry keeps alive.
+    """
+    size = sys.getsizeof(albums)
+    for album in albums:
+        size += sys.getsizeof(album) + sum(sys.getsizeof(value) for value in album.values())
+        for track in album["tracks"]:
+            size += sys.getsizeof(track) + sum(sys.getsizeof(field) for field in track)
+    return size
+
+
+class AlbumCache:  # pylint: disable=too-many-instance-attributes
+    """
+    A thread-safe LRU cache bounded by an estimated memory budget.
+
+    Entries expire after ttl seconds and are invalidated when the version
+    they were stored with (the artist's updatedAt) no longer matches.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: Any = None) -> Optional[Any]:
+        """Get a cached value, or None if it is missing, expired or stale"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry["stored_at"] > self.ttl:
+                self.expirations += 1
+                self._remove(key)
+                self.misses += 1
+                return None
+            if entry["version"] != version:
+                self.invalidations += 1
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["value"]
+
+    def put(self, key: Hashable, value: Any, size: int, version: Any = None):
+        """Store a value, evicting least recently used entries to stay within the memory budget"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = {"value": value, "size": size, "version": version, "stored_at": time.monotonic()}
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+
+    def stats(self) -> dict:
+        """Get hit/miss/eviction statistics and current memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,103 @@
+"""
+Catalog Store
+
+This module provides the CatalogStore class, which shares the artist catalog
+between uvicorn worker processes through versioned files in a common directory.
+
+One worker at a time holds the build lock, scans Plex and publishes a new
+version; the others load the current version from disk instead of scanning
+Plex themselves. A pointer file names the current version and is swapped
+atomically, so readers never see a partially written catalog.
+"""
+
+import contextlib
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Number of catalog versions kept on disk; older ones are pruned after each publish
+KEEP_VERSIONS = 2
+
+
+class CatalogStore:
+    """
+    A directory of immutable, versioned catalog files shared by worker processes.
+
+    A catalog is a dict with a "fingerprint" of the libraries it was built
+    from and an "artists" list of [id, name, genres, updated_at] rows.
+    """
+
+    def __init__(self, directory: str, refresh_interval: float = 5.0):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def _pointer_path(self) -> str:
+        return os.path.join(self.directory, "CURRENT")
+
+    def _version_path(self, version: str) -> str:
+        return os.path.join(self.directory, f"catalog-{version}.json")
+
+    @contextlib.contextmanager
+    def build_lock(self):
+        """Hold the exclusive lock under which workers check for and build a new catalog version"""
+        with open(os.path.join(self.directory, "build.lock"), "a", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def current_version(self) -> Optional[str]:
+        """Get the version named by the pointer file, or None if nothing has been published"""
+        try:
+            with open(self._pointer_path, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def read(self, version: Optional[str] = None) -> Optional[dict]:
+        """Read a catalog version (the current one by default)"""
+        version = version or self.current_version()
+        if version is None:
+            return None
+        try:
+            with open(self._version_path(version), "r", encoding="utf-8") as f:
+                catalog = json.load(f)
+        except FileNotFoundError:
+            # Pruned by a newer publish between reading the pointer and opening the file
+            return None
+        catalog["version"] = version
+        return catalog
+
+    def publish(self, catalog: dict) -> str:
+        """Write a new catalog version and atomically make it the current one"""
+        version = f"{time.time_ns()}-{os.getpid()}"
+        path = self._version_path(version)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({key: value for key, value in catalog.items() if key != "version"}, f, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+
+        pointer_tmp = f"{self._pointer_path}.tmp"
+        with open(pointer_tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(pointer_tmp, self._pointer_path)
+        logger.info("Published catalog version %s with %d artists", version, len(catalog["artists"]))
+
+        self._prune()
+        return version
+
+    def _prune(self):
+        # Version names start with a nanosecond timestamp, so they sort by age. Processes that
+        # still have an old version mapped keep their view, since unlinking does not invalidate it
+        paths = sorted(glob.glob(os.path.join(self.directory, "catalog-*.json")))
+        for path in paths[:-KEEP_VERSIONS]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
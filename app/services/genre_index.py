@@ -0,0 +1,56 @@
+"""
+Genre Index
+
+This module provides the GenreIndex class, an inverted index from normalized
+genre to the artists tagged with it. Each genre's artists are stored as an
+integer bitset over the artists' positions, so AND/OR queries over several
+genres are single bitwise operations.
+"""
+
+import re
+from typing import Dict, List, Literal, Mapping
+
+from app.models import Artist
+
+
+def normalize_genre(genre: str) -> str:
+    """Normalize a genre tag for matching, e.g. " Hip-Hop " -> "hip hop" """
+    return re.sub(r"[\s\-_/]+", " ", genre.strip().lower()).strip()
+
+
+class GenreIndex:
+    """An immutable inverted index from normalized genre to artists, built from one artist cache"""
+
+    def __init__(self, artists: Mapping[str, Artist]):
+        self._artists: List[Artist] = list(artists.values())
+        self._bits: Dict[str, int] = {}
+        self._names: Dict[str, str] = {}
+        for position, artist in enumerate(self._artists):
+            for genre in artist.genres:
+                key = normalize_genre(genre)
+                if not key:
+                    continue
+                self._bits[key] = self._bits.get(key, 0) | (1 << position)
+                # Report each genre under the spelling it was first seen with
+                self._names.setdefault(key, genre.strip())
+
+    def genres(self) -> List[dict]:
+        """Get every genre with its number of artists, most common first"""
+        counts = [{"name": self._names[key], "count": bits.bit_count()} for key, bits in self._bits.items()]
+        return sorted(counts, key=lambda g: (-g["count"], g["name"].lower()))
+
+    def filter(self, genres: List[str], match: Literal["any", "all"] = "any") -> List[Artist]:
+        """Get the artists tagged with any (OR) or all (AND) of the given genres"""
+        sets = [self._bits.get(normalize_genre(genre), 0) for genre in genres]
+        if not sets:
+            return list(self._artists)
+        bits = sets[0]
+        for other in sets[1:]:
+            bits = bits & other if match == "all" else bits | other
+
+        result = []
+        while bits:
+            lowest = bits & -bits
+            result.append(self._artists[lowest.bit_length() - 1])
+            bits ^= lowest
+        return result
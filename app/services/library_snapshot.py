@@ -0,0 +1,76 @@
+"""
+Library Snapshot
+
+This module provides the LibrarySnapshot class, an immutable view of the Plex
+connection, the music libraries and the artist catalog built from them.
+
+PlexService builds a new snapshot off to the side on every refresh and
+publishes it with a single reference assignment. Readers take one reference
+at the start of a call and see a consistent library for its whole duration
+without locking; a replaced snapshot is freed once the last reader holding
+it finishes.
+"""
+
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional, Tuple
+
+from app.models import Artist
+from app.services.genre_index import GenreIndex
+
+if TYPE_CHECKING:
+    from plexapi.server import PlexServer
+
+
+@dataclass(frozen=True)
+class LibrarySnapshot:  # pylint: disable=too-many-instance-attributes
+    """
+    One consistent, read-only version of the library.
+
+    fingerprint identifies the library contents the artists were scanned
+    from and is None until the first load; version is the catalog store
+    version the artists were read from, if any.
+    """
+
+    server: Optional["PlexServer"] = None
+    music_libraries: Tuple[Any, ...] = ()
+    artists: Mapping[str, Artist] = field(default_factory=dict)  # key: artist_id -> Artist
+    updated_at: Mapping[str, Optional[str]] = field(default_factory=dict)  # key: artist_id -> Plex updatedAt
+    fingerprint: Optional[str] = None
+    version: Optional[str] = None
+    genre_index: GenreIndex = field(init=False, repr=False, compare=False)
+    _by_name: Mapping[str, Artist] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Wrap the mappings read-only and build the derived indexes once, before the snapshot is published
+        by_name: Dict[str, Artist] = {}
+        for artist in self.artists.values():
+            by_name.setdefault(artist.name.lower(), artist)
+        object.__setattr__(self, "music_libraries", tuple(self.music_libraries))
+        object.__setattr__(self, "artists", MappingProxyType(dict(self.artists)))
+        object.__setattr__(self, "updated_at", MappingProxyType(dict(self.updated_at)))
+        object.__setattr__(self, "genre_index", GenreIndex(self.artists))
+        object.__setattr__(self, "_by_name", MappingProxyType(by_name))
+
+    @classmethod
+    def from_catalog(
+        cls, catalog: dict, server: Optional["PlexServer"] = None, music_libraries: Tuple[Any, ...] = ()
+    ) -> "LibrarySnapshot":
+        """Build a snapshot from a catalog dict of [id, name, genres, updated_at] artist rows"""
+        return cls(
+            server=server,
+            music_libraries=music_libraries,
+            artists={row[0]: Artist(id=row[0], name=row[1], genres=row[2]) for row in catalog["artists"]},
+            updated_at={row[0]: row[3] for row in catalog["artists"]},
+            fingerprint=catalog["fingerprint"],
+            version=catalog.get("version"),
+        )
+
+    @property
+    def machine_identifier(self) -> Optional[str]:
+        """Get the Plex server's machine identifier, or None before the first load"""
+        return self.server.machineIdentifier if self.server is not None else None
+
+    def find_artist(self, artist_name: str) -> Optional[Artist]:
+        """Look up an artist by case-insensitive name"""
+        return self._by_name.get(artist_name.lower())
@@ -8,15 +8,34 @@ using language models.
 import json
 import logging
 import re
-from typing import List
-
-from litellm import completion
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 from app.models import Artist
+from app.services.rate_limiter import OverloadedError, RateLimiter
 
 logger = logging.getLogger(__name__)
 
 
+def completion(**kwargs):
+    """Call litellm's completion, importing litellm on first use because importing it takes seconds"""
+    from litellm import completion as litellm_completion  # pylint: disable=import-outside-toplevel
+
+    return litellm_completion(**kwargs)
+
+
+def completion_cost(response) -> float:
+    """Estimate a completion's cost in USD from litellm's price map, or 0.0 for models it does not price"""
+    from litellm import completion_cost as litellm_completion_cost  # pylint: disable=import-outside-toplevel
+
+    try:
+        cost = litellm_completion_cost(completion_response=response)
+    except Exception:  # pylint: disable=broad-exception-caught
+        return 0.0
+    return float(cost) if isinstance(cost, (int, float)) else 0.0
+
+
 def clean_llm_response(content: str) -> str:
     """Extract JSON from LLM response, handling markdown code blocks"""
     # Check for ```json ... ``` pattern
@@ -26,19 +45,129 @@ def clean_llm_response(content: str) -> str:
     return content.strip()
 
 
+def supports_cache_control(model: str) -> bool:
+    """Check whether a model expects explicit cache_control markers for prompt caching (Anthropic-style)"""
+    model = model.lower()
+    return model.startswith("anthropic/") or "claude" in model
+
+
+def usage_value(obj, name: str) -> int:
+    """Read an integer token count from a provider usage object, treating missing values as zero"""
+    value = getattr(obj, name, None) if obj is not None else None
+    return value if isinstance(value, int) else 0
+
+
+def cached_prompt_tokens(usage) -> int:
+    """Get the number of prompt tokens the provider served from its prompt cache"""
+    # OpenAI-style usage reports cached_tokens, Anthropic-style usage reports cache_read_input_tokens
+    details = getattr(usage, "prompt_tokens_details", None) if usage is not None else None
+    return max(usage_value(details, "cached_tokens"), usage_value(usage, "cache_read_input_tokens"))
+
+
+# Default token budget for the track titles included in grounded track selection
+DEFAULT_TRACK_CONTEXT_TOKENS = 6000
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheaply estimate the token count of a piece of text (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def build_grounded_track_context(  # pylint: disable=too-many-locals
+    artist_tracks: dict, token_budget: int
+) -> Tuple[str, Dict[int, dict]]:
+    """
+    Format real track titles compactly under a token budget, keyed by short local ids.
+
+    Tracks are taken round-robin across albums, so trimming to the budget drops
+    the tail of long albums rather than whole albums.
+
+    Returns:
+        Tuple of (context text, mapping of local id -> {"artist", "title", "rating_key"})
+    """
+    albums = [(artist, album) for artist, artist_albums in artist_tracks.items() for album in artist_albums]
+    used = sum(estimate_tokens(f"{artist}:\n- {album['name']} ({album['year']}): ") for artist, album in albums)
+    selected: List[List[dict]] = [[] for _ in albums]
+
+    count = 0
+    round_index = 0
+    budget_left = True
+    while budget_left:
+        added = False
+        for i, (_, album) in enumerate(albums):
+            tracks = album.get("tracks", [])
+            if round_index >= len(tracks):
+                continue
+            cost = estimate_tokens(f"{count + 1} {tracks[round_index]['title']}|")
+            if used + cost > token_budget:
+                budget_left = False
+                break
+            selected[i].append(tracks[round_index])
+            count += 1
+            used += cost
+            added = True
+        if not added:
+            break
+        round_index += 1
+
+    id_map: Dict[int, dict] = {}
+    lines = []
+    current_artist = None
+    for (artist, album), tracks in zip(albums, selected):
+        if artist != current_artist:
+            lines.append(f"{artist}:")
+            current_artist = artist
+        entries = []
+        for track in tracks:
+            local_id = len(id_map) + 1
+            id_map[local_id] = {"artist": artist, "title": track["title"], "rating_key": track["rating_key"]}
+            entries.append(f"{local_id} {track['title']}")
+        lines.append(f"- {album['name']} ({album['year']}): {'|'.join(entries)}")
+
+    return "Available tracks by artist and album, as 'id title' separated by '|':\n" + "\n".join(lines), id_map
+
+
+def parse_track_ids(tracks_list: list, id_map: Dict[int, dict]) -> List[dict]:
+    """Resolve the local track ids returned by the model, dropping unknown ids and duplicates"""
+    resolved = []
+    seen = set()
+    for item in tracks_list:
+        raw_id = item.get("id") if isinstance(item, dict) else item
+        try:
+            local_id = int(raw_id)
+        except (TypeError, ValueError):
+            logger.warning("Ignoring invalid track id: %s", raw_id)
+            continue
+        if local_id not in id_map:
+            logger.warning("Ignoring unknown track id: %s", local_id)
+        elif local_id not in seen:
+            seen.add(local_id)
+            resolved.append(dict(id_map[local_id]))
+    return resolved
+
+
+# Retry delay suggested to clients when a provider 429 carries no Retry-After header
+DEFAULT_PROVIDER_RETRY_AFTER = 30.0
+
+
+def provider_retry_after(error: Exception) -> float:
+    """Read the Retry-After seconds from a provider rate limit error's response headers"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "litellm_response_headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return max(0.0, float(value)) if value is not None else DEFAULT_PROVIDER_RETRY_AFTER
+    except (AttributeError, TypeError, ValueError):
+        # HTTP-date values and unexpected header containers fall back to the default
+        return DEFAULT_PROVIDER_RETRY_AFTER
+
+
 class LLMService:
     """
     A service class for generating playlist recommendations using language models.
     """
 
-    def get_artist_recommendations(self, prompt: str, artists: List[Artist], model: str = "gpt-4"):
-        """First step: Get relevant artists based on the prompt"""
-        try:
-            artist_context = "Available artists and their genres:\n" + "\n".join(
-                [f"{a.name} - {', '.join(a.genres)}" for a in artists if a.name]
-            )
-
-            system_prompt = """You are a multilingual music curator helping to create playlists.
+    ARTIST_SYSTEM_PROMPT = """You are a multilingual music curator helping to create playlists.
             Your responses must ALWAYS be in English, even when the prompt is in another language.
             Analyze the available artists and their genres,
             then select the most appropriate ones for the requested playlist.
@@ -49,15 +178,123 @@ class LLMService:
             Do not add any explanations or other text - just the JSON object.
             Select 10-15 artists that match the mood/theme, only from the provided list."""
 
-            response = completion(
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None):
+        self.rate_limiter = rate_limiter
+        self._usage_lock = threading.Lock()
+        self._usage: Dict[str, dict] = {}
+
+    def _record_usage(self, stage: str, model: str, response, seconds: float):
+        """Accumulate token usage, including prompt-cache reads, latency and cost for a pipeline stage"""
+        usage = getattr(response, "usage", None)
+        cached = cached_prompt_tokens(usage)
+        cost = completion_cost(response)
+        with self._usage_lock:
+            stats = self._usage.setdefault(
+                stage,
+                {
+                    "calls": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cached_prompt_tokens": 0,
+                    "seconds": 0.0,
+                    "cost": 0.0,
+                    "models": {},
+                },
+            )
+            stats["calls"] += 1
+            stats["prompt_tokens"] += usage_value(usage, "prompt_tokens")
+            stats["completion_tokens"] += usage_value(usage, "completion_tokens")
+            stats["cached_prompt_tokens"] += cached
+            stats["seconds"] += seconds
+            stats["cost"] += cost
+            stats["models"][model] = stats["models"].get(model, 0) + 1
+        if cached:
+            logger.debug("%s: %d prompt tokens served from provider cache", stage, cached)
+
+    def _complete(self, stage: str, model: str, messages: List[dict], **kwargs):
+        """Run a completion within the provider's rate limits and record its usage"""
+        # pylint: disable-next=import-outside-toplevel
+        from litellm.exceptions import RateLimitError
+
+        estimated_tokens = estimate_tokens(json.dumps(messages))
+        if self.rate_limiter:
+            self.rate_limiter.acquire(model, estimated_tokens)
+        started = time.perf_counter()
+        try:
+            response = completion(model=model, messages=messages, **kwargs)
+        except RateLimitError as e:
+            raise OverloadedError(
+                f"Provider rate limit reached for {model}", retry_after=provider_retry_after(e)
+            ) from e
+        if self.rate_limiter:
+            usage = getattr(response, "usage", None)
+            self.rate_limiter.reconcile(model, estimated_tokens, usage_value(usage, "total_tokens"))
+        self._record_usage(stage, model, response, time.perf_counter() - started)
+        return response
+
+    def get_usage_stats(self) -> dict:
+        """Get accumulated token usage, mean latency, cost in USD and calls per model for each pipeline stage"""
+        with self._usage_lock:
+            usage = {stage: {**stats, "models": dict(stats["models"])} for stage, stats in self._usage.items()}
+        for stats in usage.values():
+            stats["mean_seconds"] = round(stats.pop("seconds") / stats["calls"], 3)
+            stats["cost"] = round(stats["cost"], 6)
+        return usage
+
+    @staticmethod
+    def build_artist_context(artists: List[Artist]) -> str:
+        """
+        Format the artist list for the artist selection prompt.
+
+        Artists are sorted so the context is byte-identical between requests,
+        which lets providers reuse it as a cached prompt prefix.
+        """
+        return "Available artists and their genres:\n" + "\n".join(
+            [f"{a.name} - {', '.join(a.genres)}" for a in sorted(artists, key=lambda a: a.name) if a.name]
+        )
+
+    @staticmethod
+    def build_album_context(artist_tracks: dict) -> str:
+        """Format the selected artists' albums for the track selection prompt"""
+        albums_context = "Available albums by artist:\n"
+        for artist, albums in artist_tracks.items():
+            albums_context += f"\n{artist}:\n"
+            for album in albums:
+                albums_context += f"- {album['name']} ({album['year']})\n"
+        return albums_context
+
+    @staticmethod
+    def build_artist_messages(artist_context: str, prompt: str, model: str) -> List[dict]:
+        """
+        Build the artist selection messages with the static library context as a stable prefix.
+
+        The per-request prompt comes last; where supported the prefix is marked for provider-side caching.
+        """
+        context_block = {"type": "text", "text": f"Context: {artist_context}"}
+        if supports_cache_control(model):
+            context_block["cache_control"] = {"type": "ephemeral"}
+        return [
+            {"role": "system", "content": LLMService.ARTIST_SYSTEM_PROMPT},
+            {"role": "user", "content": [context_block]},
+            {"role": "user", "content": f"Create a playlist for: {prompt}"},
+        ]
+
+    def get_artist_recommendations(
+        self, prompt: str, artists: List[Artist], model: str = "gpt-4", artist_context: Optional[str] = None
+    ):
+        """
+        First step: Get relevant artists based on the prompt
+
+        A prebuilt artist_context can be passed to share it across many prompts.
+        """
+        try:
+            if artist_context is None:
+                artist_context = self.build_artist_context(artists)
+
+            response = self._complete(
+                "artists",
                 model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {
-                        "role": "user",
-                        "content": f"Context: {artist_context}\n\nCreate a playlist for: {prompt}",
-                    },
-                ],
+                messages=self.build_artist_messages(artist_context, prompt, model),
                 temperature=0.7,
             )
 
@@ -83,16 +320,29 @@ class LLMService:
             raise
 
     def get_track_recommendations(
-        self, prompt: str, artist_tracks: dict, model: str = "gpt-4", min_tracks: int = 30, max_tracks: int = 50
+        self,
+        prompt: str,
+        artist_tracks: dict,
+        model: str = "gpt-4",
+        min_tracks: int = 30,
+        max_tracks: int = 50,
+        grounded: bool = False,
+        token_budget: int = DEFAULT_TRACK_CONTEXT_TOKENS,
     ):  # pylint: disable=too-many-arguments,too-many-locals,too-many-positional-arguments
-        """Get track recommendations with simplified album context"""
+        """
+        Get track recommendations with simplified album context
+
+        With grounded=True the albums in artist_tracks must carry their real
+        "tracks"; the model then picks tracks by local id and each result
+        includes the track's rating_key for exact matching.
+        """
+        if grounded:
+            return self._get_grounded_track_recommendations(
+                prompt, artist_tracks, model, min_tracks, max_tracks, token_budget
+            )
         try:
             # Format just album information for context
-            albums_context = "Available albums by artist:\n"
-            for artist, albums in artist_tracks.items():
-                albums_context += f"\n{artist}:\n"
-                for album in albums:
-                    albums_context += f"- {album['name']} ({album['year']})\n"
+            albums_context = self.build_album_context(artist_tracks)
 
             system_prompt = """You are a multilingual music curator creating a cohesive playlist.
             Your responses must ALWAYS be in English and contain ONLY a valid JSON object.
@@ -111,7 +361,8 @@ class LLMService:
             Select between {min_tracks} and {max_tracks} tracks total.
             Do not add any explanations or additional text."""
 
-            response = completion(
+            response = self._complete(
+                "tracks",
                 model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -139,6 +390,52 @@ class LLMService:
             logger.error("Track recommendation failed: %s", str(e))
             raise
 
+    def _get_grounded_track_recommendations(
+        self, prompt: str, artist_tracks: dict, model: str, min_tracks: int, max_tracks: int, token_budget: int
+    ):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        """Pick tracks by local id from a context listing real track titles"""
+        try:
+            tracks_context, id_map = build_grounded_track_context(artist_tracks, token_budget)
+
+            system_prompt = """You are a multilingual music curator creating a cohesive playlist.
+            Your responses must ALWAYS contain ONLY a valid JSON object.
+
+            You are given the real tracks available in the library, each with a numeric id.
+            Select the tracks that create a great playlist for the theme, only from the provided list.
+
+            You must respond with ONLY a JSON object listing the chosen track ids in playlist order:
+            {"tracks": [12, 7, 33]}
+
+            Do not add any explanations or additional text."""
+
+            response = self._complete(
+                "tracks",
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": f"Context: {tracks_context}"},
+                    {
+                        "role": "user",
+                        "content": f"Create a playlist with {min_tracks}-{max_tracks} tracks for: {prompt}",
+                    },
+                ],
+                temperature=0.7,
+            )
+
+            content = clean_llm_response(response.choices[0].message.content)
+            result = json.loads(content)
+            tracks_list = parse_track_ids(result.get("tracks", []), id_map)
+
+            if not tracks_list:
+                raise ValueError("No tracks found in response")
+
+            logger.info("Selected %d grounded tracks out of %d offered", len(tracks_list), len(id_map))
+            return tracks_list
+
+        except Exception as e:
+            logger.error("Grounded track recommendation failed: %s", str(e))
+            raise
+
     def generate_playlist_name(self, prompt: str, model: str = "gpt-4") -> str:
         """Generate a playlist name based on the prompt"""
         try:
@@ -147,7 +444,8 @@ class LLMService:
             Generate a SINGLE catchy and relevant playlist name based on the following prompt. Do not wrap in quotes.
             """
 
-            response = completion(
+            response = self._complete(
+                "name",
                 model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -0,0 +1,145 @@
+"""
+Match Memo
+
+This module provides the MatchMemo class, a persisted memo of how recommended
+(artist, title) pairs resolved to Plex tracks, with TTL'd negative entries for
+recommendations that could not be matched. The memo belongs to one library
+fingerprint and is cleared whenever the library changes.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MemoKey = Tuple[str, str]
+
+
+class MatchMemo:  # pylint: disable=too-many-instance-attributes
+    """
+    A thread-safe memo from normalized (artist, title) to ratingKey, with negative caching.
+
+    Entries are kept in least recently stored order and the oldest are
+    dropped beyond max_entries. Negative entries expire after miss_ttl
+    seconds, so tracks added later are eventually found.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        miss_ttl: float = 6 * 3600,
+        max_entries: int = 50000,
+        save_interval: float = 60.0,
+    ):
+        self.path = path
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self._saved_at = float("-inf")
+        self.fingerprint: Optional[str] = None
+        self._hits: "OrderedDict[MemoKey, str]" = OrderedDict()
+        self._misses: "OrderedDict[MemoKey, float]" = OrderedDict()  # key -> expiry as a wall-clock time
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._hits) + len(self._misses)
+
+    def lookup(self, key: MemoKey) -> Tuple[Optional[str], bool]:
+        """Get (rating_key, known_miss) for a key; (None, False) means it has not been resolved before"""
+        with self._lock:
+            rating_key = self._hits.get(key)
+            if rating_key is not None:
+                return rating_key, False
+            expires_at = self._misses.get(key)
+            if expires_at is None:
+                return None, False
+            if expires_at < time.time():
+                del self._misses[key]
+                self._dirty = True
+                return None, False
+            return None, True
+
+    def remember(self, key: MemoKey, rating_key: str):
+        """Record a successful resolution"""
+        with self._lock:
+            self._misses.pop(key, None)
+            self._hits[key] = rating_key
+            self._hits.move_to_end(key)
+            self._trim(self._hits)
+            self._dirty = True
+
+    def remember_miss(self, key: MemoKey):
+        """Record that a recommendation could not be matched, for miss_ttl seconds"""
+        with self._lock:
+            self._misses[key] = time.time() + self.miss_ttl
+            self._misses.move_to_end(key)
+            self._trim(self._misses)
+            self._dirty = True
+
+    def _trim(self, entries: OrderedDict):
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def reset(self, fingerprint: Optional[str]):
+        """Bind the memo to a library fingerprint, clearing it if it was built against another one"""
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return
+            if self._hits or self._misses:
+                logger.info("Library changed, clearing %d memoized track matches", len(self._hits) + len(self._misses))
+            self._hits.clear()
+            self._misses.clear()
+            self.fingerprint = fingerprint
+            self._dirty = True
+
+    def stats(self) -> dict:
+        """Get the number of memoized matches and known misses"""
+        with self._lock:
+            return {"entries": len(self._hits), "known_misses": len(self._misses)}
+
+    def load(self):
+        """Load the memo from disk, if persisted"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable match memo %s: %s", self.path, str(e))
+            return
+        with self._lock:
+            self.fingerprint = data.get("fingerprint")
+            self._hits = OrderedDict((tuple(key), rating_key) for key, rating_key in data.get("hits", []))
+            self._misses = OrderedDict((tuple(key), expires_at) for key, expires_at in data.get("misses", []))
+            self._dirty = False
+        logger.info("Loaded %d memoized track matches from %s", len(self._hits), self.path)
+
+    def save(self, force: bool = False):
+        """
+        Persist the memo if it changed, replacing the file atomically
+
+        Unless forced, saves happen at most every save_interval seconds.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._saved_at < self.save_interval):
+                return
+            self._saved_at = time.monotonic()
+            data = {
+                "fingerprint": self.fingerprint,
+                "hits": [[list(key), rating_key] for key, rating_key in self._hits.items()],
+                "misses": [[list(key), expires_at] for key, expires_at in self._misses.items()],
+            }
+            self._dirty = False
+        # Each worker writes its own temporary file; the last complete write wins
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
@@ -2,16 +2,100 @@
 Plex Service with artist caching and optimized album loading.
 """
 
+import contextlib
+import hashlib
 import logging
+import threading
+import time
 from difflib import SequenceMatcher
-from typing import Dict, List, Optional
-
-from plexapi.server import PlexServer
+from typing import TYPE_CHECKING, Dict, List, Literal, NamedTuple, Optional
 
 from app.models import Artist
+from app.services.album_cache import AlbumCache, estimate_albums_size
+from app.services.catalog_store import CatalogStore
+from app.services.library_snapshot import LibrarySnapshot
+from app.services.match_memo import MatchMemo, MemoKey
+from app.services.rate_limiter import ConcurrencyLimiter
+
+if TYPE_CHECKING:
+    from plexapi.server import PlexServer
 
 logger = logging.getLogger(__name__)
 
+# Counters reported by PlexService.get_match_stats
+MATCH_STAT_KEYS = (
+    "requested",
+    "memo_hits",
+    "known_misses",
+    "id_hits",
+    "fuzzy_hits",
+    "fallback_searches",
+    "fallback_hits",
+    "misses",
+)
+
+# Counters reported by PlexService.get_prefetch_stats
+PREFETCH_STAT_KEYS = ("requests", "predicted", "warmed", "selected", "used")
+
+# Maximum number of items sent to Plex in a single playlist add/remove request
+PLAYLIST_CHUNK_SIZE = 100
+
+
+class CachedTrack(NamedTuple):
+    """A track as held in the album cache; full Plex items are fetched only when building a playlist"""
+
+    rating_key: str
+    title: str
+    rating: Optional[float] = None  # The user's star rating, 0-10
+    plays: int = 0
+
+
+class LibraryNotLoadedError(RuntimeError):
+    """Raised when the Plex server is needed before the library has been loaded"""
+
+
+class PlaylistNotFoundError(LookupError):
+    """Raised when a target playlist ratingKey does not exist on the server"""
+
+
+class NotAPlaylistError(ValueError):
+    """Raised when a target ratingKey refers to an item that is not a playlist"""
+
+
+def connect_server(base_url: str, token: str) -> "PlexServer":
+    """Connect to a Plex server, importing plexapi on first use so that importing the app stays fast"""
+    from plexapi.server import PlexServer  # pylint: disable=import-outside-toplevel
+
+    return PlexServer(base_url, token)
+
+
+def item_version(item) -> Optional[str]:
+    """Get a Plex item's updatedAt as a string, so versions survive a round-trip through the catalog store"""
+    updated_at = getattr(item, "updatedAt", None)
+    return None if updated_at is None else str(updated_at)
+
+
+def number_or_none(value) -> Optional[float]:
+    """Keep numeric Plex attributes such as userRating or viewCount, dropping missing or non-numeric values"""
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def artist_genres(snapshot: LibrarySnapshot, artist_name: str) -> List[str]:
+    """Get a cached artist's genres, or none for artists missing from the snapshot"""
+    artist = snapshot.find_artist(artist_name)
+    return artist.genres if artist else []
+
+
+def memo_key(rec: dict) -> MemoKey:
+    """Key a track recommendation by its normalized artist and title"""
+    return rec["artist"].strip().lower(), normalize_title(rec["title"])
+
+
+def chunked(items: list, size: int):
+    """Yield successive chunks of at most size items"""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
 
 def normalize_title(title: str) -> str:
     """Normalize track title for better matching by removing common variations"""
@@ -60,163 +144,640 @@ def find_best_track_match(tracks, target_title, threshold=0.85):
     return best_match, best_score
 
 
-class PlexService:
+class PlexService:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """
     A service class for interacting with the Plex API with artist caching.
+
+    The server connection, music libraries and artist cache live in an
+    immutable LibrarySnapshot that each refresh replaces as a whole. Every
+    call reads self._snapshot once and works against that reference, so it
+    sees one consistent library even if a refresh is published meanwhile.
     """
 
-    def __init__(self, base_url: str, token: str):
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        album_cache_bytes: int = 64 * 1024 * 1024,
+        album_cache_ttl: float = 3600,
+        plex_limiter: Optional[ConcurrencyLimiter] = None,
+        catalog_store: Optional[CatalogStore] = None,
+        match_memo: Optional[MatchMemo] = None,
+    ):  # pylint: disable=too-many-arguments,too-many-positional-arguments
         self.base_url = base_url
         self.token = token
-        self._server: Optional[PlexServer] = None
-        self.machine_identifier: Optional[str] = None
-        self._music_libraries = []
-
-        # Only cache artists
-        self._artists_cache: Dict[str, Artist] = {}  # key: artist_id -> Artist
+        self.plex_limiter = plex_limiter
+        self.catalog_store = catalog_store
+        self._catalog_checked_at = 0.0
+        self._load_progress = {"status": "idle", "libraries": 0, "libraries_scanned": 0, "artists_scanned": 0}
+
+        # Replaced, never mutated; writers serialize on _publish_lock while readers never lock
+        self._snapshot = LibrarySnapshot()
+        self._publish_lock = threading.Lock()
+
+        # Album/track listings of recently used artists, invalidated by the artist's updatedAt
+        self._album_cache = AlbumCache(max_bytes=album_cache_bytes, ttl=album_cache_ttl)
+
+        # Remembers how recommendations resolved, and which could not be, for the current library
+        self.match_memo = match_memo or MatchMemo()
+
+        self._match_stats_lock = threading.Lock()
+        self._match_stats: Dict[str, int] = {key: 0 for key in MATCH_STAT_KEYS}
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_stats: Dict[str, int] = {key: 0 for key in PREFETCH_STAT_KEYS}
+
+    def _plex_slot(self):
+        """Hold a Plex concurrency slot, if a limiter is configured, around a request to the server"""
+        return self.plex_limiter.slot() if self.plex_limiter else contextlib.nullcontext()
+
+    @property
+    def library_fingerprint(self) -> Optional[str]:
+        """Get the fingerprint of the library the current artist cache was built from"""
+        return self._snapshot.fingerprint
+
+    @property
+    def catalog_version(self) -> Optional[str]:
+        """Get the catalog store version the current artist cache was loaded from"""
+        return self._snapshot.version
+
+    @property
+    def machine_identifier(self) -> Optional[str]:
+        """Get the Plex server's machine identifier"""
+        return self._snapshot.machine_identifier
+
+    def _publish(self, snapshot: LibrarySnapshot, replaces: Optional[LibrarySnapshot] = None) -> bool:
+        """
+        Make a snapshot the current one with a single reference assignment
+
+        With replaces, the snapshot is only published if the current one is
+        still that snapshot, so a slow refresh cannot undo a newer one.
+        """
+        with self._publish_lock:
+            if replaces is not None and self._snapshot is not replaces:
+                return False
+            self._snapshot = snapshot
+        self.match_memo.reset(snapshot.fingerprint)
+        return True
+
+    def _require_server(self, snapshot: LibrarySnapshot) -> "PlexServer":
+        if snapshot.server is None:
+            raise LibraryNotLoadedError("The Plex library has not been loaded yet")
+        return snapshot.server
 
     def get_cache_size(self) -> int:
         """Get the number of artists in the cache"""
-        return len(self._artists_cache)
+        return len(self._snapshot.artists)
+
+    def is_ready(self) -> bool:
+        """Check whether the artist cache has been loaded at least once"""
+        return self._snapshot.fingerprint is not None
+
+    def get_load_progress(self) -> dict:
+        """Get the status of the current or last library load, with libraries and artists scanned so far"""
+        return {**self._load_progress, "ready": self.is_ready(), "cache_size": self.get_cache_size()}
+
+    def get_album_cache_stats(self) -> dict:
+        """Get hit/miss/eviction statistics for the album/track cache"""
+        return self._album_cache.stats()
 
     def initialize(self):
-        """Initialize artist cache"""
+        """
+        Initialize or refresh the artist cache
+
+        The new connection, libraries and artists are built off to the side
+        into a LibrarySnapshot and published with a single assignment, so
+        concurrent readers never see a partial cache, and artists removed,
+        renamed or re-tagged in Plex are dropped.
+
+        With a catalog store, workers share one scan: the catalog is rebuilt
+        only if the stored version was built from a different library
+        fingerprint, otherwise the stored version is loaded.
+        """
         logger.info("Initializing PlexService artist cache...")
+        self._load_progress = {"status": "loading", "libraries": 0, "libraries_scanned": 0, "artists_scanned": 0}
         try:
-            self._server = PlexServer(self.base_url, self.token)
-            self.machine_identifier = self._server.machineIdentifier
+            server = connect_server(self.base_url, self.token)
 
             # Find all music libraries instead of assuming one called "Music"
-            self._music_libraries = []
-            for section in self._server.library.sections():
+            music_libraries = []
+            for section in server.library.sections():
                 if section.type == "artist":
-                    self._music_libraries.append(section)
-                    logger.info(f"Found music library: {section.title}")
+                    music_libraries.append(section)
+                    logger.info("Found music library: %s", section.title)
+            self._load_progress["libraries"] = len(music_libraries)
 
-            if not self._music_libraries:
+            if not music_libraries:
                 logger.warning("No music libraries found on the Plex server")
-                return
-
-            # Load all artists from all music libraries
-            for library in self._music_libraries:
-                artists = library.search(libtype="artist")
-                for artist in artists:
-                    artist_id = str(artist.ratingKey)
-                    # Only add if not already in cache (avoid duplicates across libraries)
-                    if artist_id not in self._artists_cache:
-                        self._artists_cache[artist_id] = Artist(
-                            id=artist_id,
-                            name=artist.title,
-                            genres=[genre.tag for genre in getattr(artist, "genres", [])],
-                        )
+            fingerprint = self._fingerprint_sections(music_libraries)
+
+            if self.catalog_store:
+                with self.catalog_store.build_lock():
+                    catalog = self.catalog_store.read()
+                    if catalog is None or catalog["fingerprint"] != fingerprint:
+                        catalog = self._scan_catalog(music_libraries, fingerprint)
+                        catalog["version"] = self.catalog_store.publish(catalog)
+                    else:
+                        logger.info("Using shared catalog version %s", catalog["version"])
+            else:
+                catalog = self._scan_catalog(music_libraries, fingerprint)
 
-            logger.info(
-                "Cached %d artists from %d music libraries", len(self._artists_cache), len(self._music_libraries)
-            )
+            snapshot = LibrarySnapshot.from_catalog(catalog, server=server, music_libraries=tuple(music_libraries))
+            self._publish(snapshot)
+            self._load_progress["status"] = "ready"
+            logger.info("Cached %d artists from %d music libraries", len(snapshot.artists), len(music_libraries))
 
         except Exception as e:
+            self._load_progress.update(status="error", error=str(e))
             logger.error("Failed to initialize Plex cache: %s", str(e))
             raise
 
+    def _scan_catalog(self, music_libraries, fingerprint: str) -> dict:
+        """Load all artists from all music libraries into a catalog dict"""
+        rows = {}
+        for library in music_libraries:
+            artists = library.search(libtype="artist")
+            self._load_progress["libraries_scanned"] += 1
+            self._load_progress["artists_scanned"] += len(artists)
+            for artist in artists:
+                artist_id = str(artist.ratingKey)
+                # Only add if not already in cache (avoid duplicates across libraries)
+                if artist_id not in rows:
+                    rows[artist_id] = [
+                        artist_id,
+                        artist.title,
+                        [genre.tag for genre in getattr(artist, "genres", [])],
+                        item_version(artist),
+                    ]
+        return {"fingerprint": fingerprint, "artists": list(rows.values())}
+
+    def _current_snapshot(self) -> LibrarySnapshot:
+        """
+        Get the current snapshot, first picking up a catalog version published by another worker
+
+        The store is checked at most every refresh_interval seconds.
+        """
+        snapshot = self._snapshot
+        if not self.catalog_store:
+            return snapshot
+        now = time.monotonic()
+        if now - self._catalog_checked_at < self.catalog_store.refresh_interval:
+            return snapshot
+        self._catalog_checked_at = now
+        version = self.catalog_store.current_version()
+        if version and version != snapshot.version:
+            catalog = self.catalog_store.read(version)
+            if catalog is not None:
+                logger.info("Loading shared catalog version %s", version)
+                updated = LibrarySnapshot.from_catalog(
+                    catalog, server=snapshot.server, music_libraries=snapshot.music_libraries
+                )
+                if self._publish(updated, replaces=snapshot):
+                    return updated
+        return self._snapshot
+
+    @staticmethod
+    def _fingerprint_sections(sections) -> str:
+        """Hash the identity, update time and size of the given music library sections"""
+        digest = hashlib.sha1()
+        for section in sorted(sections, key=lambda s: str(s.key)):
+            digest.update(f"{section.key}:{section.updatedAt}:{section.totalSize};".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_library_fingerprint(self) -> str:
+        """Fetch a fingerprint of the music libraries that changes whenever their contents change"""
+        server = self._snapshot.server or connect_server(self.base_url, self.token)
+        with self._plex_slot():
+            sections = [section for section in server.library.sections() if section.type == "artist"]
+            return self._fingerprint_sections(sections)
+
     def get_all_artists(self) -> List[Artist]:
         """Get all artists from cache"""
-        return list(self._artists_cache.values())
-
-    def get_artists_albums_bulk(self, artist_names: List[str]) -> dict:
-        """Get albums for multiple artists in one go"""
-        if not self._server:
-            self._server = PlexServer(self.base_url, self.token)
-
+        return list(self._current_snapshot().artists.values())
+
+    def get_genres(self) -> List[dict]:
+        """Get every genre in the library with its number of artists"""
+        return self._current_snapshot().genre_index.genres()
+
+    def get_artists_by_genres(self, genres: List[str], match: Literal["any", "all"] = "any") -> List[Artist]:
+        """Get the artists tagged with any or all of the given genres"""
+        return self._current_snapshot().genre_index.filter(genres, match)
+
+    def _search_artist(self, snapshot: LibrarySnapshot, artist_name: str):
+        """Search all music libraries for an artist, returning the first Plex match"""
+        with self._plex_slot():
+            for library in snapshot.music_libraries:
+                matches = library.search(artist_name, libtype="artist")
+                if matches:
+                    return matches[0]
+        return None
+
+    def _fetch_artist(self, snapshot: LibrarySnapshot, artist: Artist):
+        """Fetch a cached artist's Plex item by ratingKey, or None if it has been removed"""
+        # pylint: disable-next=import-outside-toplevel
+        from plexapi.exceptions import NotFound
+
+        server = self._require_server(snapshot)
+        with self._plex_slot():
+            try:
+                return server.fetchItem(int(artist.id))
+            except NotFound:
+                return None
+
+    def get_artist_albums(self, artist_name: str, search_uncached: bool = False):
+        """
+        Get an artist's albums and their tracks, served from the album cache when possible.
+
+        Cached listings are validated against the artist's updatedAt as seen by
+        the last initialize(), so edits made in Plex since then are only picked
+        up after the next library refresh or once the entry's TTL expires.
+
+        Args:
+            artist_name: Name of the artist
+            search_uncached: Also search Plex for artists missing from the artist cache
+
+        Returns:
+            Tuple of (artist title, list of {"name", "year", "tracks"} dicts whose
+            tracks are CachedTrack tuples), or None if not found
+        """
+        return self._artist_albums(self._current_snapshot(), artist_name, search_uncached)
+
+    def _artist_albums(self, snapshot: LibrarySnapshot, artist_name: str, search_uncached: bool = False):
+        cached_artist = snapshot.find_artist(artist_name)
+        if cached_artist:
+            version = snapshot.updated_at.get(cached_artist.id)
+            albums = self._album_cache.get(cached_artist.id, version)
+            if albums is not None:
+                return cached_artist.name, albums
+            plex_artist = self._fetch_artist(snapshot, cached_artist)
+        elif search_uncached:
+            plex_artist = self._search_artist(snapshot, artist_name)
+        else:
+            return None
+        if not plex_artist:
+            return None
+
+        with self._plex_slot():
+            albums = [
+                {
+                    "name": album.title,
+                    "year": album.year,
+                    "tracks": [
+                        CachedTrack(
+                            str(track.ratingKey),
+                            track.title,
+                            number_or_none(getattr(track, "userRating", None)),
+                            int(number_or_none(getattr(track, "viewCount", None)) or 0),
+                        )
+                        for track in album.tracks()
+                    ],
+                }
+                for album in plex_artist.albums()
+            ]
+        if cached_artist:
+            # Stored under the version this snapshot knows, so the next refresh that sees an edit invalidates it
+            self._album_cache.put(cached_artist.id, albums, estimate_albums_size(albums), version=version)
+        return plex_artist.title, albums
+
+    def get_artists_albums_bulk(self, artist_names: List[str], include_tracks: bool = False) -> dict:
+        """
+        Get albums for multiple artists in one go
+
+        With include_tracks, each album also lists its tracks as {"rating_key", "title"} dicts.
+        """
+        snapshot = self._current_snapshot()
         result = {}
-        # Find all matching artists first
-        artist_objects = []
         for artist_name in artist_names:
-            artist_found = None
-            # First try cache lookup by name
-            for artist in self._artists_cache.values():
-                if artist.name.lower() == artist_name.lower():
-                    # Found in cache, now get the Plex object
-                    # Search across all music libraries
-                    for library in self._music_libraries:
-                        matches = library.search(artist.name, libtype="artist")
-                        if matches:
-                            artist_found = matches[0]
-                            break
-                    if artist_found:
-                        break
-
-            if artist_found:
-                artist_objects.append(artist_found)
-            else:
+            found = self._artist_albums(snapshot, artist_name)
+            if not found:
                 logger.warning("Artist not found: %s", artist_name)
-
-        # Now get all albums in one go
-        for artist in artist_objects:
-            albums = []
-            for album in artist.albums():
-                albums.append({"name": album.title, "year": album.year, "track_count": len(album.tracks())})
-            result[artist.title] = albums
+                continue
+            title, albums = found
+            result[title] = []
+            for album in albums:
+                entry = {"name": album["name"], "year": album["year"], "track_count": len(album["tracks"])}
+                if include_tracks:
+                    entry["tracks"] = [
+                        {"rating_key": track.rating_key, "title": track.title} for track in album["tracks"]
+                    ]
+                result[title].append(entry)
 
         return result
 
-    def create_curated_playlist(
-        self, name: str, track_recommendations: List[dict]
-    ):  # pylint: disable=too-many-locals,too-many-branches
-        """Create a playlist with fuzzy track matching"""
-        if not self._server:
-            self._server = PlexServer(self.base_url, self.token)
+    def prefetch_albums(self, artist_names: List[str], stop: Optional[threading.Event] = None) -> List[str]:
+        """
+        Warm the album cache for artists that are likely to be selected, returning the ones now cached
 
+        Artists are fetched one at a time and the loop ends as soon as stop
+        is set. Failures are logged and skipped, since a prefetch must never
+        fail the request it runs alongside.
+        """
+        snapshot = self._current_snapshot()
+        warmed = []
+        for artist_name in artist_names:
+            if stop is not None and stop.is_set():
+                break
+            try:
+                if self._artist_albums(snapshot, artist_name):
+                    warmed.append(artist_name)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.debug("Prefetch of %s failed: %s", artist_name, str(e))
+        return warmed
+
+    def record_prefetch(self, predicted: List[str], warmed: List[str], selected: List[str]):
+        """Count how many of the warmed artists the model went on to select"""
+        selected_names = {name.lower() for name in selected}
+        with self._prefetch_lock:
+            self._prefetch_stats["requests"] += 1
+            self._prefetch_stats["predicted"] += len(predicted)
+            self._prefetch_stats["warmed"] += len(warmed)
+            self._prefetch_stats["selected"] += len(selected_names)
+            self._prefetch_stats["used"] += len({name.lower() for name in warmed} & selected_names)
+
+    def get_prefetch_stats(self) -> dict:
+        """
+        Get cumulative prefetch statistics
+
+        hit_rate is the share of warmed artists that were selected, and
+        coverage the share of selected artists whose albums were already warm.
+        """
+        with self._prefetch_lock:
+            stats = dict(self._prefetch_stats)
+        stats["hit_rate"] = round(stats["used"] / stats["warmed"], 3) if stats["warmed"] else 0.0
+        stats["coverage"] = round(stats["used"] / stats["selected"], 3) if stats["selected"] else 0.0
+        return stats
+
+    def fetch_tracks(self, rating_keys: List[str], chunk_size: int = PLAYLIST_CHUNK_SIZE) -> Dict[str, object]:
+        """Fetch full Plex track items for the given ratingKeys in bounded batches, keyed by ratingKey"""
+        server = self._require_server(self._snapshot)
+        tracks = {}
+        for chunk in chunked(list(dict.fromkeys(rating_keys)), chunk_size):
+            with self._plex_slot():
+                items = server.fetchItems(f"/library/metadata/{','.join(chunk)}")
+            for item in items:
+                tracks[str(item.ratingKey)] = item
+        return tracks
+
+    def _record_match_stats(self, stats: Dict[str, int]):
+        with self._match_stats_lock:
+            for key, value in stats.items():
+                self._match_stats[key] += value
+
+    def get_match_stats(self) -> dict:
+        """Get cumulative track matching statistics, including the hit rate and fallback searches"""
+        with self._match_stats_lock:
+            stats = dict(self._match_stats)
+        matched = stats["memo_hits"] + stats["id_hits"] + stats["fuzzy_hits"] + stats["fallback_hits"]
+        stats["hit_rate"] = round(matched / stats["requested"], 3) if stats["requested"] else 0.0
+        return stats
+
+    def match_tracks(self, track_recommendations: List[dict], raise_if_empty: bool = True) -> list:
+        """
+        Resolve track recommendations to Plex track objects, preserving their order.
+
+        Matching runs against the cached CachedTrack listings; the matched
+        tracks' full Plex items are then fetched in bulk by ratingKey.
+
+        Recommendations carrying a rating_key (grounded recommendations) are
+        resolved by an exact lookup; the rest use fuzzy title matching with a
+        global search fallback. Their outcomes are memoized per library
+        version, so repeated recommendations resolve without any Plex calls and
+        known misses are not searched for again until their entry expires.
+        """
+        snapshot = self._current_snapshot()
+        stats = {key: 0 for key in MATCH_STAT_KEYS}
+        stats["requested"] = len(track_recommendations)
+        resolved = [None] * len(track_recommendations)
+
+        # Process each artist's remaining tracks in bulk
+        for artist_name, recs in self._lookup_memo(track_recommendations, resolved, stats).items():
+            self._resolve_artist_tracks(snapshot, artist_name, recs, resolved, stats)
+
+        self._record_match_stats(stats)
+        logger.info(
+            "Matched %d/%d recommendations (%d memoized, %d by id, %d global searches)",
+            stats["requested"] - stats["misses"] - stats["known_misses"],
+            stats["requested"],
+            stats["memo_hits"],
+            stats["id_hits"],
+            stats["fallback_searches"],
+        )
+        self.match_memo.save()
+
+        # Cached matches are lightweight; fetch the full Plex items they refer to in bulk
+        cached_keys = [track.rating_key for track in resolved if isinstance(track, CachedTrack)]
+        fetched = self.fetch_tracks(cached_keys) if cached_keys else {}
         matched_tracks = []
-        # Group recommendations by artist for efficiency
-        artist_tracks = {}
-        for rec in track_recommendations:
-            artist_tracks.setdefault(rec["artist"], []).append(rec["title"])
-
-        # Process each artist's tracks in bulk
-        for artist_name, track_titles in artist_tracks.items():
-            # Search for artist across all music libraries
-            artists = []
-            for library in self._music_libraries:
-                found_artists = library.search(artist_name, libtype="artist")
-                if found_artists:
-                    artists.append(found_artists[0])
-                    break  # Found in one library, no need to check others
-
-            if not artists:
-                logger.warning("Artist not found: %s", artist_name)
-                continue
-
-            artist = artists[0]
-            # Get all tracks for this artist at once
-            all_tracks = []
-            for album in artist.albums():
-                all_tracks.extend(album.tracks())
+        for track in resolved:
+            if isinstance(track, CachedTrack):
+                track = fetched.get(track.rating_key)
+            if track is not None:
+                matched_tracks.append(track)
+        if not matched_tracks and raise_if_empty:
+            raise ValueError("No tracks could be matched from recommendations")
 
-            # Match tracks using fuzzy matching
-            for title in track_titles:
-                track, score = find_best_track_match(all_tracks, title)
+        return matched_tracks
+
+    def _lookup_memo(self, track_recommendations: List[dict], resolved: list, stats: dict) -> Dict[str, list]:
+        """Resolve memoized recommendations into resolved and group the rest by artist as (index, rec) pairs"""
+        artist_tracks: Dict[str, list] = {}
+        for index, rec in enumerate(track_recommendations):
+            if not rec.get("rating_key"):
+                rating_key, known_miss = self.match_memo.lookup(memo_key(rec))
+                if rating_key is not None:
+                    stats["memo_hits"] += 1
+                    resolved[index] = CachedTrack(rating_key, rec["title"])
+                    continue
+                if known_miss:
+                    stats["known_misses"] += 1
+                    continue
+            artist_tracks.setdefault(rec["artist"], []).append((index, rec))
+        return artist_tracks
+
+    def _resolve_artist_tracks(
+        self, snapshot: LibrarySnapshot, artist_name: str, recs: list, resolved: list, stats: dict
+    ):
+        """Match one artist's (index, rec) pairs against their cached albums, searching globally for the rest"""
+        found = self._artist_albums(snapshot, artist_name, search_uncached=True)
+        if not found:
+            logger.warning("Artist not found: %s", artist_name)
+            stats["misses"] += len(recs)
+            for _, rec in recs:
+                self.match_memo.remember_miss(memo_key(rec))
+            return
+
+        # Get all tracks for this artist at once
+        all_tracks = [track for album in found[1] for track in album["tracks"]]
+        tracks_by_key = None
+
+        for index, rec in recs:
+            if rec.get("rating_key"):
+                if tracks_by_key is None:
+                    tracks_by_key = {track.rating_key: track for track in all_tracks}
+                track = tracks_by_key.get(str(rec["rating_key"]))
                 if track:
-                    logger.debug("Matched '%s' to '%s' (score: %.2f)", title, track.title, score)
-                    matched_tracks.append(track)
-                else:
-                    # If no match found for artist, try global search across all music libraries
-                    global_tracks = []
-                    for library in self._music_libraries:
-                        found_tracks = library.search(title, libtype="track")
-                        global_tracks.extend(found_tracks)
-
-                    if global_tracks:
-                        track, score = find_best_track_match(global_tracks, title, threshold=0.75)
-                        if track and track.artist().title.lower() == artist_name.lower():
-                            logger.debug("Found track '%s' through global search (score: %.2f)", track.title, score)
-                            matched_tracks.append(track)
-                        else:
-                            logger.warning("No matching track found for: %s by %s", title, artist_name)
-                    else:
-                        logger.warning("No matching track found for: %s by %s", title, artist_name)
+                    stats["id_hits"] += 1
+                    resolved[index] = track
+                    continue
 
-        if not matched_tracks:
-            raise ValueError("No tracks could be matched from recommendations")
+            # Match tracks using fuzzy matching
+            track, score = find_best_track_match(all_tracks, rec["title"])
+            if track:
+                logger.debug("Matched '%s' to '%s' (score: %.2f)", rec["title"], track.title, score)
+                stats["fuzzy_hits"] += 1
+                resolved[index] = track
+                self.match_memo.remember(memo_key(rec), track.rating_key)
+                continue
 
-        playlist = self._server.createPlaylist(name, items=matched_tracks)
+            resolved[index] = self._search_globally(snapshot, artist_name, rec, stats)
+
+    def _search_globally(self, snapshot: LibrarySnapshot, artist_name: str, rec: dict, stats: dict):
+        """Search all music libraries for a recommendation the artist's albums did not match, or return None"""
+        title = rec["title"]
+        stats["fallback_searches"] += 1
+        global_tracks = []
+        with self._plex_slot():
+            for library in snapshot.music_libraries:
+                found_tracks = library.search(title, libtype="track")
+                global_tracks.extend(found_tracks)
+
+        track, score = None, 0.0
+        if global_tracks:
+            track, score = find_best_track_match(global_tracks, title, threshold=0.75)
+            if track and track.artist().title.lower() != artist_name.lower():
+                track = None
+        if not track:
+            logger.warning("No matching track found for: %s by %s", title, artist_name)
+            stats["misses"] += 1
+            self.match_memo.remember_miss(memo_key(rec))
+            return None
+        logger.debug("Found track '%s' through global search (score: %.2f)", track.title, score)
+        stats["fallback_hits"] += 1
+        self.match_memo.remember(memo_key(rec), str(track.ratingKey))
+        return track
+
+    def fill_tracks(  # pylint: disable=too-many-locals,too-many-branches
+        self, tracks: list, artist_names: List[str], min_tracks: int, max_per_artist: Optional[int] = None
+    ) -> list:
+        """
+        Pick extra tracks from the selected artists' cached albums to reach min_tracks, without another model call.
+
+        Candidates are ranked by cheap local signals: being on the same album
+        as an already chosen track, the artist's genre overlap with the chosen
+        artists, and the track's Plex rating and play count. Chosen tracks are
+        never repeated and no artist gets more than max_per_artist tracks
+        (default: an even share of min_tracks, at least 3).
+
+        Returns:
+            List of additional Plex track objects, in ranking order
+        """
+        needed = min_tracks - len(tracks)
+        if needed <= 0 or not artist_names:
+            return []
+        if max_per_artist is None:
+            max_per_artist = max(3, -(-min_tracks // len(artist_names)))
+
+        chosen_keys = {str(track.ratingKey) for track in tracks}
+        per_artist: Dict[str, int] = {}
+        for track in tracks:
+            artist = str(getattr(track, "grandparentTitle", "")).lower()
+            per_artist[artist] = per_artist.get(artist, 0) + 1
+
+        snapshot = self._current_snapshot()
+        listings = []
+        for artist_name in artist_names:
+            found = self._artist_albums(snapshot, artist_name)
+            if found:
+                listings.append(found)
+        chosen_genres = set()
+        for title, _ in listings:
+            if per_artist.get(title.lower()):
+                chosen_genres.update(genre.lower() for genre in artist_genres(snapshot, title))
+
+        candidates = []
+        for title, albums in listings:
+            genres = {genre.lower() for genre in artist_genres(snapshot, title)}
+            overlap = len(genres & chosen_genres) / len(genres | chosen_genres) if genres and chosen_genres else 0.0
+            for album in albums:
+                same_album = any(track.rating_key in chosen_keys for track in album["tracks"])
+                for track in album["tracks"]:
+                    if track.rating_key in chosen_keys:
+                        continue
+                    score = 2.0 * same_album + overlap + (track.rating or 0) / 10 + min(track.plays, 50) / 50
+                    candidates.append((score, title, track))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+        picked: List[str] = []
+        for _, title, track in candidates:
+            if len(picked) >= needed:
+                break
+            if track.rating_key in chosen_keys or per_artist.get(title.lower(), 0) >= max_per_artist:
+                continue
+            picked.append(track.rating_key)
+            chosen_keys.add(track.rating_key)
+            per_artist[title.lower()] = per_artist.get(title.lower(), 0) + 1
+
+        fetched = self.fetch_tracks(picked) if picked else {}
+        filled = [fetched[key] for key in picked if key in fetched]
+        logger.info("Filled %d tracks locally to reach the minimum of %d", len(filled), min_tracks)
+        return filled
+
+    def create_playlist(self, name: str, tracks: list, chunk_size: int = PLAYLIST_CHUNK_SIZE):
+        """Create a playlist, adding tracks in bounded chunks to keep each request small"""
+        server = self._require_server(self._snapshot)
+        with self._plex_slot():
+            playlist = server.createPlaylist(name, items=tracks[:chunk_size])
+            for chunk in chunked(tracks[chunk_size:], chunk_size):
+                playlist.addItems(chunk)
         return playlist
+
+    def sync_playlist(self, playlist_id: str, tracks: list, chunk_size: int = PLAYLIST_CHUNK_SIZE):
+        """
+        Update an existing playlist in place so it contains exactly the given tracks.
+
+        Only the difference against the playlist's current items is applied,
+        using addItems/removeItems in bounded chunks. Order is not rewritten:
+        tracks that were already present keep their position and new tracks
+        are appended in recommendation order.
+
+        Returns:
+            Tuple of (playlist, added_count, removed_count)
+
+        Raises:
+            PlaylistNotFoundError: If no item exists with the ratingKey
+            NotAPlaylistError: If the ratingKey refers to something other than a playlist
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from plexapi.exceptions import NotFound
+
+        with self._plex_slot():
+            try:
+                playlist = self._require_server(self._snapshot).fetchItem(int(playlist_id))
+            except NotFound as e:
+                raise PlaylistNotFoundError(f"Playlist {playlist_id} not found") from e
+            if getattr(playlist, "TYPE", None) != "playlist":
+                raise NotAPlaylistError(f"Item {playlist_id} is not a playlist")
+            current_items = playlist.items()
+        current_keys = {str(item.ratingKey) for item in current_items}
+        target_keys = {str(track.ratingKey) for track in tracks}
+
+        to_remove = [item for item in current_items if str(item.ratingKey) not in target_keys]
+        to_add = []
+        for track in tracks:
+            key = str(track.ratingKey)
+            if key not in current_keys:
+                to_add.append(track)
+                current_keys.add(key)  # Skip duplicate recommendations of the same track
+
+        with self._plex_slot():
+            for chunk in chunked(to_remove, chunk_size):
+                playlist.removeItems(chunk)
+            for chunk in chunked(to_add, chunk_size):
+                playlist.addItems(chunk)
+
+        logger.info("Synced playlist '%s': %d added, %d removed", playlist.title, len(to_add), len(to_remove))
+        return playlist, len(to_add), len(to_remove)
+
+    def create_curated_playlist(self, name: str, track_recommendations: List[dict]):
+        """Create a playlist with fuzzy track matching"""
+        matched_tracks = self.match_tracks(track_recommendations)
+        return self.create_playlist(name, matched_tracks)
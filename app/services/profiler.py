@@ -0,0 +1,209 @@
+"""
+Request Profiler
+
+This module provides opt-in request profiling. Every traced request records a
+timeline of spans (LLM calls, Plex calls); sampled requests are additionally
+profiled with cProfile in the worker threads that do the blocking work. Slow
+and sampled requests are kept in a bounded in-memory capture log.
+"""
+
+import contextlib
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, List, Optional
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+# cProfile allows one active profiler per process on Python 3.12+, so only one span profiles at a time
+_profiler_lock = threading.Lock()
+
+# Source files whose allocations are attributed to the PlexService caches in memory snapshots. An allocation
+# counts when any frame of its traceback is in one of them, so tracing must keep more than the innermost frame.
+CACHE_MODULES = (
+    "plex_service.py",
+    "library_snapshot.py",
+    "genre_index.py",
+    "album_cache.py",
+    "match_memo.py",
+    "catalog_store.py",
+)
+TRACEMALLOC_FRAMES = 25
+
+
+class RequestTrace:  # pylint: disable=too-many-instance-attributes
+    """The span timeline and, when sampled, the merged cProfile data of one request"""
+
+    def __init__(self, name: str, profile: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.profile = profile
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.spans: List[dict] = []
+        self._started = time.perf_counter()
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, duration: float):
+        """Record a span, with its start as an offset from the start of the request"""
+        with self._lock:
+            self.spans.append(
+                {
+                    "name": name,
+                    "start": round(start - self._started, 4),
+                    "duration": round(duration, 4),
+                    "thread": threading.current_thread().name,
+                }
+            )
+
+    def add_profile(self, profile: cProfile.Profile):
+        """Keep the cProfile data collected while a span ran"""
+        with self._lock:
+            self._profiles.append(profile)
+
+    def finish(self):
+        """Mark the request as finished"""
+        self.duration = time.perf_counter() - self._started
+
+    def profile_text(self, limit: int = 40) -> Optional[str]:
+        """Render the merged profile of all spans, sorted by cumulative time"""
+        if not self._profiles:
+            return None
+        output = io.StringIO()
+        stats = pstats.Stats(self._profiles[0], stream=output)
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+    def summary(self) -> dict:
+        """Get the capture's identity and timing without the span and profile details"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration": round(self.duration or 0.0, 4),
+            "profiled": self.profile,
+        }
+
+    def to_dict(self) -> dict:
+        """Get the full capture"""
+        return {**self.summary(), "spans": sorted(self.spans, key=lambda s: s["start"]), "profile": self.profile_text()}
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """
+    Record a span of the current request's trace, if any.
+
+    When the request is sampled for profiling, the span is also profiled with
+    cProfile, unless another span, in this or any other thread, is already
+    being profiled.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    profile = None
+    if trace.profile and _profiler_lock.acquire(blocking=False):
+        profile = cProfile.Profile()
+        profile.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter() - start)
+        if profile is not None:
+            profile.disable()
+            _profiler_lock.release()
+            trace.add_profile(profile)
+
+
+def traced(name: str, func):
+    """Wrap a blocking function so that it runs inside a span"""
+
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class RequestProfiler:
+    """
+    Traces requests and keeps the slow and sampled ones.
+
+    sample_rate is the fraction of requests profiled with cProfile; requests
+    slower than slow_threshold seconds are captured with their span timeline
+    even when they were not sampled.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slow_threshold: float = 30.0, max_captures: int = 50):
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self._captures: Deque[RequestTrace] = deque(maxlen=max_captures)
+
+    @contextlib.contextmanager
+    def trace(self, name: str, force_profile: bool = False):
+        """Trace the requests handled inside the block, profiling it if forced or sampled"""
+        trace = RequestTrace(name, profile=force_profile or random.random() < self.sample_rate)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+            if trace.profile or trace.duration >= self.slow_threshold:
+                self._captures.append(trace)
+
+    def settings(self) -> dict:
+        """Get the current sampling settings"""
+        return {"sample_rate": self.sample_rate, "slow_threshold": self.slow_threshold}
+
+    def list_captures(self) -> List[dict]:
+        """Get summaries of the captured requests, newest first"""
+        return [trace.summary() for trace in reversed(self._captures)]
+
+    def get_capture(self, capture_id: str) -> Optional[dict]:
+        """Get a captured request's span timeline and profile"""
+        for trace in self._captures:
+            if trace.id == capture_id:
+                return trace.to_dict()
+        return None
+
+
+def memory_snapshot(limit: int = 20) -> dict:
+    """
+    Summarise memory allocated since tracing started, grouped by source line.
+
+    Allocations made from the cache modules, directly or through the models
+    and libraries they call, are totalled separately so the memory held by
+    the PlexService caches can be read at a glance. This needs tracemalloc
+    to be started with TRACEMALLOC_FRAMES frames.
+    """
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    snapshot = tracemalloc.take_snapshot()
+    cache_filter = [tracemalloc.Filter(True, f"*{module}", all_frames=True) for module in CACHE_MODULES]
+    cache_stats = snapshot.filter_traces(cache_filter).statistics("lineno")
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": True,
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "cache_bytes": sum(stat.size for stat in cache_stats),
+        "cache_top": [
+            {"location": str(stat.traceback), "bytes": stat.size, "count": stat.count} for stat in cache_stats[:limit]
+        ],
+        "top": [
+            {"location": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:limit]
+        ],
+    }
@@ -0,0 +1,217 @@
+"""
+Rate limiting and admission control
+
+This module provides token-bucket rate limits for LLM providers, a
+concurrency cap for Plex calls and a bounded admission queue for incoming
+requests, so the service sheds load with 429s instead of failing under bursts.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+
+class OverloadedError(Exception):
+    """Raised when a request cannot be served within its deadline; retry_after is in seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def provider_for_model(model: str) -> str:
+    """Get the provider name litellm routes a model to, e.g. "anthropic/claude-3" -> "anthropic" """
+    if "/" in model:
+        return model.split("/", 1)[0]
+    if model.startswith("claude"):
+        return "anthropic"
+    return "openai"
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that hands out reservations.
+
+    Reserving may drive the balance negative; the returned wait is how long
+    the caller must sleep until its reservation is covered by refills.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Reserve tokens, returning the seconds to wait before using them"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.refill_per_second
+
+    def refund(self, amount: float):
+        """Return tokens from a cancelled or over-estimated reservation"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class RateLimiter:
+    """
+    Per-provider requests-per-minute and tokens-per-minute limits for LLM calls.
+
+    Callers wait for capacity up to max_wait seconds; beyond that an
+    OverloadedError carrying the expected wait is raised instead.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_wait: float,
+        overrides: Optional[Dict[str, dict]] = None,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self._overrides = overrides or {}
+        self._validate_limits()
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def _validate_limits(self):
+        """Reject non-positive limits, which would stall every call or divide by zero when refilling"""
+        limits = {
+            "default": {"requests_per_minute": self.requests_per_minute, "tokens_per_minute": self.tokens_per_minute},
+            **self._overrides,
+        }
+        for provider, provider_limits in limits.items():
+            if not isinstance(provider_limits, dict):
+                raise ValueError(f"Rate limits for {provider} must be an object")
+            for key, value in provider_limits.items():
+                if key not in ("requests_per_minute", "tokens_per_minute"):
+                    raise ValueError(f"Unknown rate limit {key!r} for {provider}")
+                if not isinstance(value, (int, float)) or value <= 0:
+                    raise ValueError(f"Rate limit {key} for {provider} must be a positive number, got {value!r}")
+
+    def _get_buckets(self, provider: str) -> Dict[str, TokenBucket]:
+        with self._lock:
+            if provider not in self._buckets:
+                limits = self._overrides.get(provider, {})
+                rpm = limits.get("requests_per_minute", self.requests_per_minute)
+                tpm = limits.get("tokens_per_minute", self.tokens_per_minute)
+                self._buckets[provider] = {
+                    "requests": TokenBucket(rpm, rpm / 60),
+                    "tokens": TokenBucket(tpm, tpm / 60),
+                }
+            return self._buckets[provider]
+
+    def acquire(self, model: str, tokens: int):
+        """Block until the model's provider has capacity for one call of the given size"""
+        provider = provider_for_model(model)
+        buckets = self._get_buckets(provider)
+        wait = max(buckets["requests"].reserve(1), buckets["tokens"].reserve(tokens))
+        if wait > self.max_wait:
+            buckets["requests"].refund(1)
+            buckets["tokens"].refund(tokens)
+            raise OverloadedError(f"Rate limit for {provider} exceeded", retry_after=wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    def reconcile(self, model: str, estimated_tokens: int, actual_tokens: int):
+        """Correct a reservation once the provider has reported the real token usage"""
+        if not actual_tokens:
+            return
+        buckets = self._get_buckets(provider_for_model(model))
+        if actual_tokens > estimated_tokens:
+            buckets["tokens"].reserve(actual_tokens - estimated_tokens)
+        else:
+            buckets["tokens"].refund(estimated_tokens - actual_tokens)
+
+
+class ConcurrencyLimiter:  # pylint: disable=too-few-public-methods
+    """A thread-safe cap on concurrent calls with a bounded wait for a free slot"""
+
+    def __init__(self, max_concurrent: int, max_wait: float, name: str = "backend"):
+        self.max_wait = max_wait
+        self.name = name
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    @contextmanager
+    def slot(self):
+        """Hold one slot for the duration of the block"""
+        if not self._semaphore.acquire(timeout=self.max_wait):  # pylint: disable=consider-using-with
+            raise OverloadedError(f"Too many concurrent {self.name} calls", retry_after=self.max_wait)
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+class AdmissionController:
+    """
+    Admits requests while their combined weight fits within max_concurrent, queueing up to max_queue more.
+
+    Queued requests wait at most queue_timeout seconds; when the queue is
+    full, requests are rejected immediately with an OverloadedError.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiting = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def stats(self) -> dict:
+        """Get the admitted weight and the number of queued requests"""
+        return {"active": self._active, "queued": self._waiting, "max_concurrent": self.max_concurrent}
+
+    @asynccontextmanager
+    async def admit(self, weight: int = 1):
+        """
+        Hold admission capacity for the duration of the block.
+
+        Larger jobs such as batches pass a weight (capped at max_concurrent)
+        so they take a proportional share of the capacity.
+        """
+        weight = max(1, min(weight, self.max_concurrent))
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        def has_capacity() -> bool:
+            return self._active + weight <= self.max_concurrent
+
+        async with self._condition:
+            # Fast path: admit without yielding to the event loop when capacity is free and nobody is queued
+            if not self._waiting and has_capacity():
+                self._active += weight
+            else:
+                if self._waiting >= self.max_queue:
+                    raise OverloadedError("Server is busy, request queue is full", retry_after=self.queue_timeout)
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(self._condition.wait_for(has_capacity), timeout=self.queue_timeout)
+                except asyncio.TimeoutError as e:
+                    raise OverloadedError("Timed out waiting in request queue", retry_after=self.queue_timeout) from e
+                finally:
+                    self._waiting -= 1
+                self._active += weight
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._active -= weight
+                self._condition.notify_all()
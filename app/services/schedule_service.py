@@ -0,0 +1,237 @@
+"""
+Schedule Service
+
+This module provides the ScheduleService class, a persisted registry of
+auto-refreshing playlists and the in-process scheduler that regenerates them.
+
+The registry file is shared safely between uvicorn worker processes: every
+change is a locked read-modify-write, only one worker (holding the leader
+lock) runs the scheduler loop, and a per-schedule lock keeps a manual run
+from overlapping a scheduled one. Locks use fcntl, so this requires a POSIX
+system.
+"""
+
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import random
+import time
+import uuid
+import zlib
+from typing import IO, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.models import PlaylistRequest, PlaylistResponse, Schedule, ScheduleRequest
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the interval added as random jitter when rescheduling, so runs registered together drift apart
+JITTER_FRACTION = 0.1
+
+
+class ScheduleBusyError(Exception):
+    """Raised when a schedule is already running in this or another worker"""
+
+
+class ScheduleService:  # pylint: disable=too-many-instance-attributes
+    """
+    A service class for registering playlists that regenerate on a fixed cadence.
+
+    Runs are skipped when the library fingerprint has not changed since the
+    schedule last ran, and results are written back to the same Plex playlist.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        run_playlist: Callable[[PlaylistRequest, str], Awaitable[PlaylistResponse]],
+        get_fingerprint: Callable[[], str],
+        poll_interval: float = 30.0,
+    ):
+        self.path = path
+        self._run_playlist = run_playlist
+        self._get_fingerprint = get_fingerprint
+        self.poll_interval = poll_interval
+        self._schedules: Dict[str, Schedule] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._leader_file: Optional[IO] = None
+        self._running_file: Optional[IO] = None
+        self._running: Set[str] = set()
+
+    def load(self):
+        """Load the schedule registry from disk"""
+        if not os.path.exists(self.path):
+            self._schedules = {}
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self._schedules = {item["id"]: Schedule(**item) for item in data}
+        logger.debug("Loaded %d playlist schedules from %s", len(self._schedules), self.path)
+
+    def save(self):
+        """Persist the schedule registry, replacing the file atomically"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([schedule.model_dump() for schedule in self._schedules.values()], f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @contextlib.contextmanager
+    def _registry(self, write: bool = True):
+        """Hold the registry file lock, reloading before the block and saving after it"""
+        with open(f"{self.path}.lock", "a", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.load()
+                yield
+                if write:
+                    self.save()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _claim(self, schedule_id: str):
+        """Mark a schedule as running, across threads of this worker and across worker processes"""
+        if schedule_id in self._running:
+            raise ScheduleBusyError(f"Schedule {schedule_id} is already running")
+        if self._running_file is None:
+            running_path = f"{self.path}.running"
+            self._running_file = open(running_path, "a", encoding="utf-8")  # pylint: disable=consider-using-with
+        try:
+            # Byte-range locks on one shared file give each schedule its own cross-process lock
+            fcntl.lockf(self._running_file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, zlib.crc32(schedule_id.encode("utf-8")))
+        except OSError as e:
+            raise ScheduleBusyError(f"Schedule {schedule_id} is already running") from e
+        self._running.add(schedule_id)
+
+    def _release(self, schedule_id: str):
+        self._running.discard(schedule_id)
+        fcntl.lockf(self._running_file, fcntl.LOCK_UN, 1, zlib.crc32(schedule_id.encode("utf-8")))
+
+    def _try_become_leader(self) -> bool:
+        """Take the leader lock so that only one worker process runs due schedules"""
+        if self._leader_file is not None:
+            return True
+        leader_file = open(f"{self.path}.leader", "a", encoding="utf-8")  # pylint: disable=consider-using-with
+        try:
+            fcntl.flock(leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            leader_file.close()
+            return False
+        self._leader_file = leader_file
+        logger.info("This worker (pid %d) now runs the playlist scheduler", os.getpid())
+        return True
+
+    def list_schedules(self) -> List[Schedule]:
+        """Get all registered schedules"""
+        with self._registry(write=False):
+            return list(self._schedules.values())
+
+    def get_schedule(self, schedule_id: str) -> Optional[Schedule]:
+        """Get a schedule by id"""
+        with self._registry(write=False):
+            return self._schedules.get(schedule_id)
+
+    def add_schedule(self, request: ScheduleRequest) -> Schedule:
+        """Register a new schedule, spreading its first run across its interval"""
+        schedule_id = uuid.uuid4().hex[:12]
+        interval = request.interval_hours * 3600
+        # A stable per-schedule offset keeps schedules created together from all firing at once
+        offset = (zlib.crc32(schedule_id.encode("utf-8")) % 1000) / 1000 * interval
+        schedule = Schedule(id=schedule_id, next_run_at=time.time() + offset, **request.model_dump())
+        with self._registry():
+            self._schedules[schedule_id] = schedule
+        return schedule
+
+    def remove_schedule(self, schedule_id: str) -> bool:
+        """Remove a schedule, returning whether it existed"""
+        with self._registry():
+            return self._schedules.pop(schedule_id, None) is not None
+
+    def _store(self, schedule: Schedule):
+        """Write back a schedule's run state, unless it was removed while running"""
+        with self._registry():
+            if schedule.id in self._schedules:
+                self._schedules[schedule.id] = schedule
+
+    @staticmethod
+    def next_run_time(schedule: Schedule, now: float) -> float:
+        """Compute the next run time with jitter to avoid thundering herds"""
+        interval = schedule.interval_hours * 3600
+        return now + interval + random.uniform(0, interval * JITTER_FRACTION)
+
+    async def run_schedule(self, schedule: Schedule, force: bool = False) -> Schedule:
+        """
+        Regenerate a scheduled playlist unless the library is unchanged since its last run
+
+        Raises ScheduleBusyError if the schedule is already running in any worker.
+        """
+        self._claim(schedule.id)
+        try:
+            now = time.time()
+            schedule.next_run_at = self.next_run_time(schedule, now)
+            try:
+                fingerprint = await asyncio.to_thread(self._get_fingerprint)
+                if not force and schedule.playlist_id and fingerprint == schedule.last_fingerprint:
+                    logger.info("Skipping schedule %s: library unchanged since last run", schedule.id)
+                    schedule.last_status = "skipped"
+                else:
+                    response = await self._run_playlist(schedule.to_playlist_request(), fingerprint)
+                    schedule.playlist_id = response.id or schedule.playlist_id
+                    schedule.last_fingerprint = fingerprint
+                    schedule.last_run_at = now
+                    schedule.last_status = "success"
+                    schedule.last_error = None
+                    logger.info("Refreshed scheduled playlist %s (%s)", schedule.id, response.name)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Scheduled playlist %s failed: %s", schedule.id, str(e))
+                schedule.last_status = "error"
+                schedule.last_error = str(e)
+            self._store(schedule)
+        finally:
+            self._release(schedule.id)
+        return schedule
+
+    async def run_due(self):
+        """Run every schedule whose next run time has passed, one at a time"""
+        now = time.time()
+        due = sorted(
+            (s for s in self.list_schedules() if s.next_run_at <= now),
+            key=lambda s: s.next_run_at,
+        )
+        for schedule in due:
+            # The schedule may have been removed while an earlier one was running
+            if self.get_schedule(schedule.id) is None:
+                continue
+            try:
+                await self.run_schedule(schedule)
+            except ScheduleBusyError:
+                logger.info("Skipping schedule %s: already running", schedule.id)
+
+    async def _run_forever(self):
+        while True:
+            try:
+                # Workers that lose the election keep retrying, so another takes over if the leader exits
+                if self._try_become_leader():
+                    await self.run_due()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Scheduler tick failed: %s", str(e))
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        """Start the background scheduler loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        """Stop the background scheduler loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._leader_file is not None:
+            self._leader_file.close()
+            self._leader_file = None
@@ -0,0 +1,72 @@
+"""Tests for the album cache."""
+
+from unittest.mock import patch
+
+from app.services.album_cache import AlbumCache, estimate_albums_size
+
+
+def test_get_put_and_stats():
+    """Test cache hits and misses are counted."""
+    cache = AlbumCache(max_bytes=100, ttl=60)
+    assert cache.get("a") is None
+    cache.put("a", ["album"], size=10)
+    assert cache.get("a") == ["album"]
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["bytes"] == 10
+
+
+def test_lru_eviction_within_budget():
+    """Test least recently used entries are evicted to stay within the memory budget."""
+    cache = AlbumCache(max_bytes=25, ttl=60)
+    cache.put("a", 1, size=10)
+    cache.put("b", 2, size=10)
+    cache.get("a")  # "b" is now least recently used
+    cache.put("c", 3, size=10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 20
+
+
+def test_oversized_entry_not_cached():
+    """Test entries larger than the whole budget are not stored."""
+    cache = AlbumCache(max_bytes=5, ttl=60)
+    cache.put("a", 1, size=10)
+    assert len(cache) == 0
+
+
+def test_ttl_expiry():
+    """Test entries expire after the TTL."""
+    cache = AlbumCache(max_bytes=100, ttl=60)
+    with patch("app.services.album_cache.time.monotonic", return_value=1000.0):
+        cache.put("a", 1, size=10)
+    with patch("app.services.album_cache.time.monotonic", return_value=1061.0):
+        assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_version_invalidation():
+    """Test entries stored for an older updatedAt are invalidated."""
+    cache = AlbumCache(max_bytes=100, ttl=60)
+    cache.put("a", 1, size=10, version="v1")
+    assert cache.get("a", "v1") == 1
+    assert cache.get("a", "v2") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_estimate_albums_size():
+    """Test measured sizes grow with the number and length of tracks."""
+
+    def albums(*titles):
+        return [{"name": "Album", "year": 2020, "tracks": [(str(i), title) for i, title in enumerate(titles)]}]
+
+    small = estimate_albums_size(albums("A"))
+    large = estimate_albums_size(albums("A", "B", "C"))
+    longer = estimate_albums_size(albums("A" * 200))
+    assert large > small > 0
+    assert longer >= small + 199
@@ -0,0 +1,33 @@
+"""Tests for the shared catalog store."""
+
+import glob
+import os
+
+from app.services.catalog_store import KEEP_VERSIONS, CatalogStore
+
+
+def catalog(fingerprint="fp-1"):
+    """Build a minimal catalog."""
+    return {"fingerprint": fingerprint, "artists": [["1", "Artist1", ["Rock"], "2024-01-01"]]}
+
+
+def test_publish_and_read(tmp_path):
+    """Test a published catalog becomes the current version and round-trips through the file."""
+    store = CatalogStore(str(tmp_path))
+    assert store.current_version() is None
+    assert store.read() is None
+
+    version = store.publish(catalog())
+
+    assert store.current_version() == version
+    assert store.read() == {**catalog(), "version": version}
+
+
+def test_publish_prunes_old_versions(tmp_path):
+    """Test only the newest versions are kept on disk."""
+    store = CatalogStore(str(tmp_path))
+    versions = [store.publish(catalog(f"fp-{i}")) for i in range(KEEP_VERSIONS + 2)]
+
+    assert len(glob.glob(os.path.join(str(tmp_path), "catalog-*.json"))) == KEEP_VERSIONS
+    assert store.read(versions[0]) is None
+    assert store.read()["fingerprint"] == f"fp-{KEEP_VERSIONS + 1}"
@@ -0,0 +1,101 @@
+"""Tests for the command-line batch generator"""
+
+# pylint: disable=redefined-outer-name
+
+import asyncio
+import io
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest  # pylint: disable=import-error
+
+from app import cli
+from app.models import PlaylistResponse
+
+
+@pytest.fixture
+def prompts_file(tmp_path):
+    """A JSONL prompt file with two valid requests, a blank line and an invalid one"""
+    path = tmp_path / "prompts.jsonl"
+    path.write_text(
+        '{"prompt": "Focus music"}\n\n{"prompt": "Dinner jazz", "min_tracks": 5}\n{"prompt": "Bad", "min_tracks": 0}\n',
+        encoding="utf-8",
+    )
+    return path
+
+
+@pytest.fixture
+def services():
+    """Mocked Plex and LLM services"""
+    plex_service = MagicMock()
+    plex_service.get_match_stats.return_value = {"requested": 4, "hit_rate": 0.75}
+    plex_service.match_memo.stats.return_value = {"entries": 3, "known_misses": 1}
+    plex_service.get_prefetch_stats.return_value = {}
+    plex_service.catalog_version = "1-1"
+    llm_service = MagicMock()
+    llm_service.get_usage_stats.return_value = {}
+    return plex_service, llm_service
+
+
+def test_read_requests_reports_invalid_lines(prompts_file):
+    """Test valid lines parse to requests and invalid ones become errors, keeping their position"""
+    rows = cli.read_requests(str(prompts_file))
+
+    assert [row[0] for row in rows] == ["Focus music", "Dinner jazz", ""]
+    assert rows[1][1].min_tracks == 5
+    assert rows[2][1] is None
+    assert "line 4" in rows[2][2]
+
+
+def test_read_requests_leaves_stdin_open(monkeypatch):
+    """Test reading requests from - does not close stdin"""
+    stdin = io.StringIO('{"prompt": "Focus music"}\n')
+    monkeypatch.setattr("sys.stdin", stdin)
+
+    rows = cli.read_requests("-")
+
+    assert [row[0] for row in rows] == ["Focus music"]
+    assert not stdin.closed
+
+
+def test_generate_streams_results_and_summarises(prompts_file, services):
+    """Test each result is written as a JSONL line and the summary counts failures"""
+    plex_service, llm_service = services
+    response = PlaylistResponse(name="Mix", track_count=2, tracks=[])
+    output = io.StringIO()
+
+    with patch("app.cli.generate_playlist", AsyncMock(side_effect=[response, ValueError("No tracks")])):
+        summary = asyncio.run(
+            cli.generate(plex_service, llm_service, cli.read_requests(str(prompts_file)), output, concurrency=2)
+        )
+
+    results = sorted((json.loads(line) for line in output.getvalue().splitlines()), key=lambda r: r["index"])
+    assert len(results) == 3
+    assert sum(result["playlist"] is not None for result in results) == 1
+    assert sum(result["error"] == "No tracks" for result in results) == 1
+    assert summary["prompts"] == 3
+    assert summary["succeeded"] == 1
+    assert summary["failed"] == 2
+    assert summary["match_stats"]["hit_rate"] == 0.75
+
+
+def test_main_loads_library_once(prompts_file, services, tmp_path):
+    """Test the generate command initializes the library once and persists the match memo"""
+    plex_service, llm_service = services
+    response = PlaylistResponse(name="Mix", track_count=2, tracks=[])
+    output_path = tmp_path / "results.jsonl"
+
+    with (
+        patch("app.cli.build_plex_service", return_value=plex_service) as build_plex,
+        patch("app.cli.build_llm_service", return_value=llm_service),
+        patch("app.cli.generate_playlist", AsyncMock(return_value=response)),
+    ):
+        exit_code = cli.main(
+            ["generate", str(prompts_file), "-o", str(output_path), "-c", "3", "--catalog-dir", str(tmp_path)]
+        )
+
+    assert exit_code == 1  # The invalid line counts as a failure
+    build_plex.assert_called_once_with(catalog_dir=str(tmp_path))
+    plex_service.initialize.assert_called_once()
+    plex_service.match_memo.save.assert_called_once_with(force=True)
+    assert len(output_path.read_text(encoding="utf-8").splitlines()) == 3
@@ -5,13 +5,17 @@ Tests for FastAPI endpoints
 # pylint: disable=redefined-outer-name,unused-argument
 
 import os
-from unittest.mock import patch
+import subprocess
+import sys
+from unittest.mock import Mock, patch
 
 import pytest  # pylint: disable=import-error
 from fastapi.testclient import TestClient
 
 from app.main import app
 from app.models import Artist
+from app.services.plex_service import PlaylistNotFoundError
+from app.services.rate_limiter import OverloadedError
 
 client = TestClient(app)
 
@@ -29,12 +33,21 @@ def mock_plex_service():
     with patch("app.main.plex_service") as mock:
         # Setup common mock returns
         mock.get_cache_size.return_value = 100
+        mock.get_album_cache_stats.return_value = {"entries": 0, "hits": 0, "misses": 0, "evictions": 0}
+        mock.get_match_stats.return_value = {"requested": 10, "id_hits": 8, "fallback_searches": 1, "hit_rate": 0.9}
+        mock.match_memo.stats.return_value = {"entries": 5, "known_misses": 1}
+        mock.get_prefetch_stats.return_value = {"warmed": 4, "used": 3, "hit_rate": 0.75}
         mock.get_all_artists.return_value = [
             Artist(id="1", name="Artist 1", genres=["Rock"]),
             Artist(id="2", name="Artist 2", genres=["Pop"]),
         ]
         mock.machine_identifier = "test-machine"
         mock.initialize.return_value = None  # Mock the initialize method
+        mock.match_tracks.return_value = [
+            Mock(grandparentTitle="Artist 1", title="Song 1"),
+            Mock(grandparentTitle="Artist 2", title="Song 2"),
+        ]
+        mock.fill_tracks.return_value = []
         yield mock
 
 
@@ -54,9 +67,20 @@ def mock_llm_service():
 
 def test_health_check(mock_plex_service):
     """Test health check endpoint"""
-    response = client.get("/health")
+    with patch("app.main.llm_service") as mock_llm:
+        mock_llm.get_usage_stats.return_value = {"artists": {"calls": 1, "cached_prompt_tokens": 900}}
+        response = client.get("/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "healthy", "cache_size": 100}
+    assert response.json() == {
+        "status": "healthy",
+        "cache_size": 100,
+        "album_cache": {"entries": 0, "hits": 0, "misses": 0, "evictions": 0},
+        "match_stats": {"requested": 10, "id_hits": 8, "fallback_searches": 1, "hit_rate": 0.9},
+        "match_memo": {"entries": 5, "known_misses": 1},
+        "prefetch": {"warmed": 4, "used": 3, "hit_rate": 0.75},
+        "llm_usage": {"artists": {"calls": 1, "cached_prompt_tokens": 900}},
+        "admission": {"active": 0, "queued": 0, "max_concurrent": 4},
+    }
 
 
 def test_get_artists(mock_plex_service):
@@ -73,7 +97,7 @@ def test_create_recommendations(mock_plex_service, mock_llm_service):
     """Test creating playlist recommendations"""
     # Mock playlist creation
     mock_playlist = type("MockPlaylist", (), {"title": "Test Playlist", "ratingKey": "123"})()
-    mock_plex_service.create_curated_playlist.return_value = mock_playlist
+    mock_plex_service.create_playlist.return_value = mock_playlist
 
     request_data = {"prompt": "Create a rock playlist", "model": "gpt-4", "min_tracks": 2, "max_tracks": 5}
 
@@ -88,17 +112,107 @@ def test_create_recommendations(mock_plex_service, mock_llm_service):
     assert len(data["tracks"]) == 2
 
 
+def test_create_recommendations_single_call_mode(mock_plex_service, mock_llm_service):
+    """Test small libraries skip artist selection and pick tracks from all candidates"""
+    mock_playlist = type("MockPlaylist", (), {"title": "Test Playlist", "ratingKey": "123"})()
+    mock_plex_service.create_playlist.return_value = mock_playlist
+
+    response = client.post("/recommendations", json={"prompt": "Create a rock playlist"})
+    assert response.status_code == 200
+    assert response.json()["mode"] == "single"
+    mock_llm_service.get_artist_recommendations.assert_not_called()
+    mock_plex_service.get_artists_albums_bulk.assert_called_once_with(["Artist 1", "Artist 2"], include_tracks=False)
+
+    response = client.post("/recommendations", json={"prompt": "Create a rock playlist", "mode": "two_step"})
+    assert response.json()["mode"] == "two_step"
+    mock_llm_service.get_artist_recommendations.assert_called_once()
+
+
+def test_create_recommendations_updates_existing_playlist(mock_plex_service, mock_llm_service):
+    """Test updating an existing playlist instead of creating a new one"""
+    mock_playlist = type("MockPlaylist", (), {"title": "Existing Playlist", "ratingKey": "456"})()
+    mock_plex_service.sync_playlist.return_value = (mock_playlist, 3, 1)
+
+    request_data = {"prompt": "Create a rock playlist", "min_tracks": 2, "max_tracks": 5, "playlist_id": "456"}
+
+    response = client.post("/recommendations", json=request_data)
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["name"] == "Existing Playlist"
+    assert data["id"] == "456"
+    assert data["added"] == 3
+    assert data["removed"] == 1
+    mock_plex_service.create_playlist.assert_not_called()
+    mock_llm_service.generate_playlist_name.assert_not_called()
+
+
+def test_create_recommendations_invalid_playlist_id(mock_plex_service, mock_llm_service):
+    """Test non-numeric playlist ids are rejected and unknown playlists return 404"""
+    response = client.post("/recommendations", json={"prompt": "Rock", "playlist_id": "abc"})
+    assert response.status_code == 422
+
+    mock_plex_service.sync_playlist.side_effect = PlaylistNotFoundError("Playlist 456 not found")
+    response = client.post("/recommendations", json={"prompt": "Rock", "playlist_id": "456"})
+    assert response.status_code == 404
+
+
 def test_create_recommendations_error(mock_plex_service, mock_llm_service):
     """Test error handling in recommendations endpoint"""
     mock_llm_service.get_artist_recommendations.side_effect = Exception("LLM error")
 
-    request_data = {"prompt": "Create a rock playlist", "model": "gpt-4", "min_tracks": 2, "max_tracks": 5}
+    request_data = {
+        "prompt": "Create a rock playlist",
+        "model": "gpt-4",
+        "min_tracks": 2,
+        "max_tracks": 5,
+        "mode": "two_step",
+    }
 
     response = client.post("/recommendations", json=request_data)
     assert response.status_code == 500
     assert "LLM error" in response.json()["detail"]
 
 
+def test_create_recommendations_batch(mock_plex_service, mock_llm_service):
+    """Test batch generation shares the album fetch and reports per-prompt errors"""
+    mock_playlist = type("MockPlaylist", (), {"title": "Test Playlist", "ratingKey": "123"})()
+    mock_plex_service.create_playlist.return_value = mock_playlist
+    mock_plex_service.get_artists_albums_bulk.return_value = {
+        "Artist 1": [{"name": "Album 1", "year": 2020}],
+        "Artist 2": [{"name": "Album 2", "year": 2021}],
+    }
+    mock_llm_service.get_artist_recommendations.side_effect = [["Artist 1", "Artist 2"], Exception("LLM error")]
+
+    request_data = {
+        "requests": [
+            {"prompt": "Morning mix", "min_tracks": 2, "max_tracks": 5, "mode": "two_step"},
+            {"prompt": "Evening mix", "min_tracks": 2, "max_tracks": 5, "mode": "two_step"},
+        ],
+        "concurrency": 1,
+    }
+
+    response = client.post("/recommendations/batch", json=request_data)
+    assert response.status_code == 200
+
+    results = response.json()["results"]
+    assert results[0]["playlist"]["name"] == "Test Playlist"
+    assert results[0]["error"] is None
+    assert results[1]["playlist"] is None
+    assert "LLM error" in results[1]["error"]
+    mock_llm_service.build_artist_context.assert_called_once()
+    mock_plex_service.get_artists_albums_bulk.assert_called_once_with(["Artist 1", "Artist 2"], include_tracks=False)
+
+
+def test_create_recommendations_overloaded(mock_plex_service, mock_llm_service):
+    """Test rate limited requests get a 429 with Retry-After instead of a 500"""
+    mock_llm_service.get_artist_recommendations.side_effect = OverloadedError("Rate limit exceeded", retry_after=2.5)
+
+    response = client.post("/recommendations", json={"prompt": "Create a rock playlist", "mode": "two_step"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+
+
 def test_root_endpoint(mock_env):
     """Test root endpoint serving HTML"""
     response = client.get("/")
@@ -111,3 +225,62 @@ def test_root_endpoint(mock_env):
     assert "window.plexToken" in content
     assert "http://plex:32400" in content
     assert "test-token" in content
+
+
+def test_recommendations_profiling_capture(mock_plex_service, mock_llm_service):
+    """Test a profiled request can be read back through the admin API"""
+    mock_playlist = type("MockPlaylist", (), {"title": "Test Playlist", "ratingKey": "123"})()
+    mock_plex_service.create_playlist.return_value = mock_playlist
+
+    with patch.dict(os.environ, {"PLEXMUSE_ADMIN_TOKEN": "secret"}):
+        response = client.post("/recommendations", json={"prompt": "Test"}, headers={"X-Plexmuse-Profile": "1"})
+        assert response.status_code == 200
+        trace_id = response.headers["X-Plexmuse-Trace-Id"]
+
+        assert client.get("/admin/profiling").status_code == 403
+        captures = client.get("/admin/profiling", headers={"X-Admin-Token": "secret"}).json()["captures"]
+        assert trace_id in [capture["id"] for capture in captures]
+        capture = client.get(f"/admin/profiling/{trace_id}", headers={"X-Admin-Token": "secret"}).json()
+        assert any(span["name"].startswith("plex:") for span in capture["spans"])
+
+
+def test_admin_api_disabled_without_token():
+    """Test admin endpoints are unavailable unless an admin token is configured"""
+    with patch.dict(os.environ):
+        os.environ.pop("PLEXMUSE_ADMIN_TOKEN", None)
+        assert client.get("/admin/memory").status_code == 404
+
+
+def test_ready_reports_load_progress(mock_plex_service):
+    """Test the readiness probe and playlist endpoints wait for the library load"""
+    mock_plex_service.get_load_progress.return_value = {"status": "loading", "ready": False, "artists_scanned": 10}
+    mock_plex_service.is_ready.return_value = False
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["artists_scanned"] == 10
+    assert client.post("/recommendations", json={"prompt": "Test"}).status_code == 503
+    assert client.get("/health").status_code == 200
+
+    mock_plex_service.get_load_progress.return_value = {"status": "ready", "ready": True}
+    assert client.get("/ready").status_code == 200
+
+
+def test_import_defers_heavy_libraries():
+    """Test importing the app does not import litellm or plexapi"""
+    code = "import sys, app.main; print(any(m in sys.modules for m in ('litellm', 'plexapi')))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_get_artists_by_genre(mock_plex_service):
+    """Test artists can be filtered by genre and genres are listed with counts"""
+    mock_plex_service.get_artists_by_genres.return_value = [Artist(id="1", name="Artist 1", genres=["Rock"])]
+    mock_plex_service.get_genres.return_value = [{"name": "Rock", "count": 1}, {"name": "Pop", "count": 1}]
+
+    response = client.get("/artists?genre=rock&genre=indie&genre_match=all")
+    assert response.status_code == 200
+    assert [a["name"] for a in response.json()] == ["Artist 1"]
+    mock_plex_service.get_artists_by_genres.assert_called_once_with(["rock", "indie"], "all")
+
+    assert client.get("/genres").json() == [{"name": "Rock", "count": 1}, {"name": "Pop", "count": 1}]
@@ -0,0 +1,36 @@
+"""Tests for the genre index."""
+
+from app.models import Artist
+from app.services.genre_index import GenreIndex, normalize_genre
+
+
+def build_index():
+    """Build an index over a few artists."""
+    artists = [
+        Artist(id="1", name="A", genres=["Rock", "Indie"]),
+        Artist(id="2", name="B", genres=["rock"]),
+        Artist(id="3", name="C", genres=["Hip-Hop", "Indie"]),
+    ]
+    return GenreIndex({artist.id: artist for artist in artists})
+
+
+def test_normalize_genre():
+    """Test genres differing only in case and separators normalize to the same key."""
+    assert normalize_genre(" Hip-Hop ") == normalize_genre("hip hop") == "hip hop"
+
+
+def test_genre_counts():
+    """Test genres are counted across spellings, most common first."""
+    assert build_index().genres() == [
+        {"name": "Indie", "count": 2},
+        {"name": "Rock", "count": 2},
+        {"name": "Hip-Hop", "count": 1},
+    ]
+
+
+def test_filter_any_and_all():
+    """Test OR and AND queries over several genres."""
+    index = build_index()
+    assert [a.id for a in index.filter(["rock", "hip hop"])] == ["1", "2", "3"]
+    assert [a.id for a in index.filter(["rock", "indie"], match="all")] == ["1"]
+    assert not index.filter(["Jazz"])
@@ -0,0 +1,45 @@
+"""Tests for the library snapshot."""
+
+import dataclasses
+
+import pytest  # pylint: disable=import-error
+
+from app.services.library_snapshot import LibrarySnapshot
+
+CATALOG = {
+    "fingerprint": "abc",
+    "version": "1-1",
+    "artists": [["1", "Artist1", ["Rock"], "2024-01-01"], ["2", "Artist2", ["Jazz"], None]],
+}
+
+
+def test_from_catalog_builds_indexes():
+    """Test a catalog becomes artists, versions, a name lookup and a genre index."""
+    snapshot = LibrarySnapshot.from_catalog(CATALOG)
+
+    assert snapshot.fingerprint == "abc"
+    assert snapshot.version == "1-1"
+    assert snapshot.updated_at["1"] == "2024-01-01"
+    assert snapshot.find_artist("ARTIST2").id == "2"
+    assert snapshot.find_artist("Nobody") is None
+    assert [a.name for a in snapshot.genre_index.filter(["rock"])] == ["Artist1"]
+
+
+def test_snapshot_is_read_only():
+    """Test neither the snapshot nor its mappings can be changed after publishing."""
+    artists = {}
+    snapshot = LibrarySnapshot(artists=artists)
+    artists["1"] = None  # The caller's dict is copied, not shared
+
+    assert len(snapshot.artists) == 0
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        snapshot.fingerprint = "changed"
+    with pytest.raises(TypeError):
+        snapshot.artists["1"] = None
+
+
+def test_empty_snapshot_is_not_loaded():
+    """Test the initial snapshot has no server or fingerprint."""
+    snapshot = LibrarySnapshot()
+    assert snapshot.fingerprint is None
+    assert snapshot.machine_identifier is None
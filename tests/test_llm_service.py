@@ -7,7 +7,14 @@ from unittest.mock import Mock
 import pytest  # pylint: disable=import-error
 
 from app.models import Artist
-from app.services.llm_service import LLMService, clean_llm_response
+from app.services.llm_service import (
+    DEFAULT_PROVIDER_RETRY_AFTER,
+    LLMService,
+    build_grounded_track_context,
+    clean_llm_response,
+    parse_track_ids,
+    provider_retry_after,
+)
 
 
 def test_clean_llm_response_with_json_block():
@@ -54,6 +61,71 @@ def test_get_artist_recommendations(mock_completion, sample_artists):
     mock_completion.assert_called_once()
 
 
+def test_get_artist_recommendations_with_shared_context(mock_completion, sample_artists):
+    """Test a prebuilt artist context is sent as-is."""
+    mock_response = Mock()
+    mock_response.choices = [Mock(message=Mock(content='{"artists": ["Artist1"]}'))]
+    mock_completion.return_value = mock_response
+
+    service = LLMService()
+    context = service.build_artist_context(sample_artists)
+    result = service.get_artist_recommendations("Test prompt", [], artist_context=context)
+
+    assert result == ["Artist1"]
+    assert "Artist3 - Hip Hop, Rap" in str(mock_completion.call_args)
+
+
+def test_artist_messages_keep_library_context_as_stable_prefix(sample_artists):
+    """Test the library context is identical across prompts and the prompt comes last."""
+    context = LLMService.build_artist_context(list(reversed(sample_artists)))
+    first = LLMService.build_artist_messages(context, "Rainy day", "gpt-4")
+    second = LLMService.build_artist_messages(LLMService.build_artist_context(sample_artists), "Road trip", "gpt-4")
+
+    assert first[:2] == second[:2]
+    assert first[-1]["content"].endswith("Rainy day")
+    assert "cache_control" not in first[1]["content"][0]
+
+    claude = LLMService.build_artist_messages(context, "Rainy day", "anthropic/claude-3-5-sonnet-latest")
+    assert claude[1]["content"][0]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_cached_prompt_tokens_are_recorded(mock_completion, sample_artists):
+    """Test provider cache-read token counts are accumulated per stage."""
+    mock_response = Mock()
+    mock_response.choices = [Mock(message=Mock(content='{"artists": ["Artist1"]}'))]
+    mock_response.usage = Mock(prompt_tokens=1000, completion_tokens=20, prompt_tokens_details=Mock(cached_tokens=900))
+    mock_completion.return_value = mock_response
+
+    service = LLMService()
+    service.get_artist_recommendations("Test prompt", sample_artists)
+
+    stats = service.get_usage_stats()["artists"]
+    assert stats["calls"] == 1
+    assert stats["prompt_tokens"] == 1000
+    assert stats["completion_tokens"] == 20
+    assert stats["cached_prompt_tokens"] == 900
+
+
+def test_usage_records_latency_cost_and_model_per_stage(mock_completion, monkeypatch):
+    """Test each stage accumulates its own latency, cost and calls per model."""
+    mock_response = Mock()
+    mock_response.choices = [Mock(message=Mock(content="Rainy Days"))]
+    mock_response.usage = Mock(prompt_tokens=50, completion_tokens=5)
+    mock_completion.return_value = mock_response
+    monkeypatch.setattr("app.services.llm_service.completion_cost", lambda response: 0.0002)
+
+    service = LLMService()
+    service.generate_playlist_name("Rain", model="gpt-4o-mini")
+    service.generate_playlist_name("Sun", model="gpt-4o-mini")
+
+    stats = service.get_usage_stats()
+    assert list(stats) == ["name"]
+    assert stats["name"]["cost"] == 0.0004
+    assert stats["name"]["models"] == {"gpt-4o-mini": 2}
+    assert stats["name"]["mean_seconds"] >= 0
+    assert "seconds" not in stats["name"]
+
+
 def test_get_track_recommendations(mock_completion):
     """Test getting track recommendations."""
     # Sample artist tracks data
@@ -64,16 +136,10 @@ def test_get_track_recommendations(mock_completion):
 
     # Mock the LLM response
     mock_response = Mock()
-    mock_response.choices = [
-        Mock(
-            message=Mock(
-                content="""{"tracks": [
+    mock_response.choices = [Mock(message=Mock(content="""{"tracks": [
                     {"artist": "Artist1", "title": "Track1"},
                     {"artist": "Artist2", "title": "Track2"}
-                ]}"""
-            )
-        )
-    ]
+                ]}"""))]
     mock_completion.return_value = mock_response
 
     service = LLMService()
@@ -133,3 +199,71 @@ def test_get_track_recommendations_empty_response(mock_completion):
     service = LLMService()
     with pytest.raises(ValueError, match="No tracks found in response"):
         service.get_track_recommendations("Test prompt", {})
+
+
+@pytest.fixture
+def grounded_artist_tracks():
+    """Fixture to provide albums with their real tracks."""
+    return {
+        "Artist1": [
+            {
+                "name": "Album1",
+                "year": 2020,
+                "tracks": [{"rating_key": "101", "title": "Song A"}, {"rating_key": "102", "title": "Song B"}],
+            }
+        ],
+        "Artist2": [{"name": "Album2", "year": 2021, "tracks": [{"rating_key": "201", "title": "Song C"}]}],
+    }
+
+
+def test_build_grounded_track_context(grounded_artist_tracks):
+    """Test real track titles are listed with short local ids."""
+    context, id_map = build_grounded_track_context(grounded_artist_tracks, token_budget=1000)
+
+    assert "- Album1 (2020): 1 Song A|2 Song B" in context
+    assert "- Album2 (2021): 3 Song C" in context
+    assert id_map[3] == {"artist": "Artist2", "title": "Song C", "rating_key": "201"}
+
+
+def test_build_grounded_track_context_respects_budget(grounded_artist_tracks):
+    """Test trimming to the token budget keeps every album but drops the tail of long ones."""
+    # Album headers cost 14 estimated tokens and each track entry 3, leaving room for two tracks
+    context, id_map = build_grounded_track_context(grounded_artist_tracks, token_budget=21)
+
+    assert "Song B" not in context
+    assert [entry["title"] for entry in id_map.values()] == ["Song A", "Song C"]
+
+
+def test_parse_track_ids_drops_unknown_and_duplicates():
+    """Test model-returned ids are resolved and invalid ones ignored."""
+    id_map = {
+        1: {"artist": "A", "title": "T1", "rating_key": "11"},
+        2: {"artist": "A", "title": "T2", "rating_key": "12"},
+    }
+    result = parse_track_ids([2, "1", {"id": 2}, 99, "x"], id_map)
+    assert [rec["rating_key"] for rec in result] == ["12", "11"]
+
+
+def test_get_grounded_track_recommendations(mock_completion, grounded_artist_tracks):
+    """Test grounded recommendations return rating keys for exact matching."""
+    mock_response = Mock()
+    mock_response.choices = [Mock(message=Mock(content='{"tracks": [3, 1]}'))]
+    mock_completion.return_value = mock_response
+
+    service = LLMService()
+    result = service.get_track_recommendations("Test prompt", grounded_artist_tracks, grounded=True)
+
+    assert result == [
+        {"artist": "Artist2", "title": "Song C", "rating_key": "201"},
+        {"artist": "Artist1", "title": "Song A", "rating_key": "101"},
+    ]
+    assert "1 Song A|2 Song B" in str(mock_completion.call_args)
+
+
+def test_provider_retry_after():
+    """Test the provider's Retry-After header is used when present."""
+    assert provider_retry_after(Mock(response=Mock(headers={"retry-after": "7"}))) == 7.0
+    assert provider_retry_after(Mock(response=Mock(headers={}), litellm_response_headers=None)) == (
+        DEFAULT_PROVIDER_RETRY_AFTER
+    )
+    assert provider_retry_after(Exception("no response")) == DEFAULT_PROVIDER_RETRY_AFTER
@@ -0,0 +1,46 @@
+"""Tests for the match memo."""
+
+from unittest.mock import patch
+
+from app.services.match_memo import MatchMemo
+
+
+def test_remember_and_lookup():
+    """Test resolutions and known misses are returned, and misses expire."""
+    memo = MatchMemo(miss_ttl=60)
+    memo.remember(("artist", "song"), "101")
+    memo.remember_miss(("artist", "made up"))
+
+    assert memo.lookup(("artist", "song")) == ("101", False)
+    assert memo.lookup(("artist", "made up")) == (None, True)
+    assert memo.lookup(("artist", "unknown")) == (None, False)
+
+    with patch("app.services.match_memo.time.time", return_value=10**12):
+        assert memo.lookup(("artist", "made up")) == (None, False)
+
+
+def test_reset_clears_on_library_change():
+    """Test the memo is cleared when bound to a different library fingerprint."""
+    memo = MatchMemo()
+    memo.reset("fp-1")
+    memo.remember(("artist", "song"), "101")
+    memo.reset("fp-1")
+    assert len(memo) == 1
+    memo.reset("fp-2")
+    assert len(memo) == 0
+
+
+def test_persisted_across_restarts(tmp_path):
+    """Test a saved memo is loaded back with its fingerprint."""
+    path = str(tmp_path / "memo.json")
+    memo = MatchMemo(path=path)
+    memo.reset("fp-1")
+    memo.remember(("artist", "song"), "101")
+    memo.remember_miss(("artist", "made up"))
+    memo.save()
+
+    restored = MatchMemo(path=path)
+    restored.load()
+    assert restored.fingerprint == "fp-1"
+    assert restored.lookup(("artist", "song")) == ("101", False)
+    assert restored.lookup(("artist", "made up")) == (None, True)
@@ -0,0 +1,193 @@
+"""Tests for the playlist generation pipeline."""
+
+# pylint: disable=redefined-outer-name
+
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest  # pylint: disable=import-error
+
+from app.models import Artist, PlaylistRequest
+from app import pipeline
+from app.pipeline import generate_playlist, generate_playlists_batch, resolve_mode
+
+
+@pytest.fixture
+def plex_service():
+    """Fixture to mock the Plex service."""
+    mock = MagicMock()
+    mock.get_all_artists.return_value = [Artist(id="1", name="Artist 1", genres=["Rock"])]
+    mock.get_artists_albums_bulk.return_value = {"Artist 1": [{"name": "Album 1", "year": 2020}]}
+    mock.match_tracks.return_value = [MagicMock(grandparentTitle="Artist 1", title="Song")]
+    mock.create_playlist.return_value = MagicMock(title="Playlist", ratingKey=1)
+    mock.machine_identifier = "test-machine"
+    return mock
+
+
+def test_batch_holds_one_slot_per_llm_call(plex_service):
+    """Test the track and name calls of one prompt do not exceed the batch concurrency together"""
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def llm_call(result):
+        def call(**kwargs):  # pylint: disable=unused-argument
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight -= 1
+            return result
+
+        return call
+
+    llm_service = MagicMock()
+    llm_service.get_track_recommendations.side_effect = llm_call([{"artist": "Artist 1", "title": "Song"}])
+    llm_service.generate_playlist_name.side_effect = llm_call("Name")
+
+    requests = [PlaylistRequest(prompt=f"Mix {i}", mode="single") for i in range(3)]
+    results = asyncio.run(generate_playlists_batch(plex_service, llm_service, requests, concurrency=1))
+
+    assert all(result.playlist is not None for result in results)
+    assert peak == 1
+
+
+def test_resolve_mode_caps_single_mode(monkeypatch):
+    """Test explicit single mode is downgraded above the hard artist cap"""
+    monkeypatch.setenv("PLEXMUSE_SINGLE_MODE_MAX_ARTISTS", "2")
+    artists = [Artist(id=str(i), name=f"Artist {i}", genres=[]) for i in range(3)]
+
+    assert resolve_mode(PlaylistRequest(prompt="Mix", mode="single"), artists[:2]) == "single"
+    assert resolve_mode(PlaylistRequest(prompt="Mix", mode="single"), artists) == "two_step"
+
+
+def test_single_mode_falls_back_when_context_too_large(plex_service, monkeypatch):
+    """Test a single-call request whose album context exceeds the token cap runs artist selection"""
+    monkeypatch.setenv("PLEXMUSE_SINGLE_MODE_MAX_TOKENS", "5")
+    llm_service = MagicMock()
+    llm_service.get_artist_recommendations.return_value = ["Artist 1"]
+    llm_service.get_track_recommendations.return_value = [{"artist": "Artist 1", "title": "Song"}]
+    llm_service.generate_playlist_name.return_value = "Name"
+
+    response = asyncio.run(generate_playlist(plex_service, llm_service, PlaylistRequest(prompt="Mix", mode="single")))
+
+    assert response.mode == "two_step"
+    llm_service.get_artist_recommendations.assert_called_once()
+    plex_service.get_artists_albums_bulk.assert_called_once()
+
+
+def test_genre_constraints_narrow_candidates(plex_service):
+    """Test genre constraints shrink the candidate set before any model call"""
+    plex_service.get_artists_by_genres.return_value = [Artist(id="2", name="Artist 2", genres=["Jazz"])]
+    llm_service = MagicMock()
+    llm_service.get_track_recommendations.return_value = [{"artist": "Artist 2", "title": "Song"}]
+    llm_service.generate_playlist_name.return_value = "Name"
+
+    request = PlaylistRequest(prompt="Mix", genres=["jazz"], genre_match="all")
+    asyncio.run(generate_playlist(plex_service, llm_service, request))
+
+    plex_service.get_artists_by_genres.assert_called_once_with(["jazz"], "all")
+    plex_service.get_all_artists.assert_not_called()
+    assert plex_service.get_artists_albums_bulk.call_args.args[0] == ["Artist 2"]
+
+
+def test_genre_constraints_without_matches(plex_service):
+    """Test a request whose genres match no artist fails without calling the model"""
+    plex_service.get_artists_by_genres.return_value = []
+    llm_service = MagicMock()
+
+    with pytest.raises(pipeline.NoMatchingArtistsError):
+        asyncio.run(generate_playlist(plex_service, llm_service, PlaylistRequest(prompt="Mix", genres=["polka"])))
+    llm_service.get_artist_recommendations.assert_not_called()
+
+
+def test_curation_tops_up_to_min_tracks(plex_service):
+    """Test dropped matches are filled locally instead of failing or returning a short playlist"""
+    plex_service.match_tracks.return_value = []
+    filled = [MagicMock(grandparentTitle="Artist 1", ratingKey=i) for i in range(2)]
+    for i, track in enumerate(filled):
+        track.title = f"Filler {i}"
+    plex_service.fill_tracks.return_value = filled
+    llm_service = MagicMock()
+    llm_service.get_track_recommendations.return_value = [{"artist": "Artist 1", "title": "Invented"}]
+    llm_service.generate_playlist_name.return_value = "Name"
+
+    request = PlaylistRequest(prompt="Mix", mode="single", min_tracks=2, max_tracks=5)
+    response = asyncio.run(generate_playlist(plex_service, llm_service, request))
+
+    assert response.filled == 2
+    assert response.track_count == 2
+    assert [track.title for track in response.tracks] == ["Filler 0", "Filler 1"]
+    plex_service.fill_tracks.assert_called_once_with([], ["Artist 1"], 2)
+    assert plex_service.create_playlist.call_args.args[1] == filled
+    assert llm_service.get_track_recommendations.call_count == 1
+
+
+def test_stage_models_are_routed(plex_service, monkeypatch):
+    """Test each LLM stage uses the request override, then the configured default, then the request model"""
+    monkeypatch.delenv("PLEXMUSE_MODEL_ARTISTS", raising=False)
+    monkeypatch.delenv("PLEXMUSE_MODEL_TRACKS", raising=False)
+    monkeypatch.setenv("PLEXMUSE_MODEL_NAME", "gpt-4o-mini")
+    llm_service = MagicMock()
+    llm_service.get_artist_recommendations.return_value = ["Artist 1"]
+    llm_service.get_track_recommendations.return_value = [{"artist": "Artist 1", "title": "Song"}]
+    llm_service.generate_playlist_name.return_value = "Name"
+
+    request = PlaylistRequest(prompt="Mix", mode="two_step", model="gpt-4o", artists_model="claude-3-5-haiku")
+    asyncio.run(generate_playlist(plex_service, llm_service, request))
+
+    assert llm_service.get_artist_recommendations.call_args.kwargs["model"] == "claude-3-5-haiku"
+    assert llm_service.get_track_recommendations.call_args.kwargs["model"] == "gpt-4o"
+    assert llm_service.generate_playlist_name.call_args.kwargs["model"] == "gpt-4o-mini"
+
+
+def test_predict_artists_from_prompt():
+    """Test artists named in the prompt rank first, then artists by mentioned genres, and others are skipped"""
+    artists = [
+        Artist(id="1", name="Miles Davis", genres=["Jazz"]),
+        Artist(id="2", name="Portishead", genres=["Trip-Hop", "Electronic"]),
+        Artist(id="3", name="Slayer", genres=["Metal"]),
+        Artist(id="4", name="Massive Attack", genres=["Trip Hop"]),
+    ]
+
+    predicted = pipeline.predict_artists("Late night trip-hop, a bit like Massive Attack", artists, limit=5)
+
+    assert predicted == ["Massive Attack", "Portishead"]
+    assert pipeline.predict_artists("Something nice", artists, limit=5) == []
+    assert pipeline.predict_artists("Jazz", artists, limit=0) == []
+
+
+def test_prefetch_runs_while_artists_are_selected(plex_service, monkeypatch):
+    """Test predicted artists are warmed during artist selection and the prefetch outcome is recorded"""
+    monkeypatch.setenv("PLEXMUSE_PREFETCH_ARTISTS", "3")
+    plex_service.get_all_artists.return_value = [
+        Artist(id=str(i), name=f"Artist {i}", genres=["Rock"]) for i in range(30)
+    ]
+    warming = threading.Event()
+
+    def prefetch_albums(names, stop):
+        warming.set()
+        assert not stop.is_set()
+        return names[:2]
+
+    def get_artist_recommendations(**kwargs):  # pylint: disable=unused-argument
+        assert warming.wait(1)
+        return ["Artist 1", "artist 0", "Artist 29"]
+
+    plex_service.prefetch_albums.side_effect = prefetch_albums
+    llm_service = MagicMock()
+    llm_service.get_artist_recommendations.side_effect = get_artist_recommendations
+    llm_service.get_track_recommendations.return_value = [{"artist": "Artist 1", "title": "Song"}]
+    llm_service.generate_playlist_name.return_value = "Name"
+
+    asyncio.run(generate_playlist(plex_service, llm_service, PlaylistRequest(prompt="Rock anthems", min_tracks=1)))
+
+    predicted = plex_service.prefetch_albums.call_args.args[0]
+    assert len(predicted) == 3
+    plex_service.record_prefetch.assert_called_once_with(
+        predicted, predicted[:2], ["Artist 1", "artist 0", "Artist 29"]
+    )
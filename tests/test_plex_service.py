@@ -3,12 +3,25 @@
 # pylint: disable=protected-access,redefined-outer-name
 
 import logging
+import threading
 from unittest.mock import Mock, MagicMock, patch
 
 import pytest  # pylint: disable=import-error
 
 from app.models import Artist
-from app.services.plex_service import PlexService, normalize_title, find_best_track_match
+from plexapi.exceptions import NotFound
+
+from app.services.catalog_store import CatalogStore
+from app.services.library_snapshot import LibrarySnapshot
+from app.services.plex_service import (
+    CachedTrack,
+    LibraryNotLoadedError,
+    NotAPlaylistError,
+    PlaylistNotFoundError,
+    PlexService,
+    find_best_track_match,
+    normalize_title,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -50,7 +63,7 @@ def test_find_best_track_match():
 @pytest.fixture
 def mock_plex_server():
     """Fixture to create a mock Plex server."""
-    with patch("app.services.plex_service.PlexServer") as mock_server:
+    with patch("app.services.plex_service.connect_server") as mock_server:
         # Mock the machine identifier
         mock_server.return_value.machineIdentifier = "mock_machine_id"
 
@@ -74,6 +87,17 @@ def plex_service(mock_plex_server):  # pylint: disable=unused-argument
     return service
 
 
+def use_library(service, server=None, libraries=(), artists=(), updated_at=None):
+    """Publish a loaded library snapshot with the given server, music libraries and artists"""
+    service._snapshot = LibrarySnapshot(
+        server=server,
+        music_libraries=tuple(libraries),
+        artists={artist.id: artist for artist in artists},
+        updated_at=updated_at or {},
+        fingerprint="test",
+    )
+
+
 def test_plex_service_initialization(plex_service, mock_plex_server):  # pylint: disable=unused-argument
     """Test PlexService initialization."""
     mock_server, mock_library = mock_plex_server
@@ -98,17 +122,17 @@ def test_plex_service_initialization(plex_service, mock_plex_server):  # pylint:
 
     # Verify cache was populated
     assert plex_service.get_cache_size() == 2
-    assert "1" in plex_service._artists_cache
-    assert "2" in plex_service._artists_cache
+    assert "1" in plex_service._snapshot.artists
+    assert "2" in plex_service._snapshot.artists
 
 
 def test_get_all_artists(plex_service):
     """Test retrieving all artists from cache."""
     # Populate cache with test data
-    plex_service._artists_cache = {
-        "1": Artist(id="1", name="Artist1", genres=["Rock"]),
-        "2": Artist(id="2", name="Artist2", genres=["Pop"]),
-    }
+    use_library(
+        plex_service,
+        artists=[Artist(id="1", name="Artist1", genres=["Rock"]), Artist(id="2", name="Artist2", genres=["Pop"])],
+    )
 
     artists = plex_service.get_all_artists()
     assert len(artists) == 2
@@ -123,7 +147,8 @@ def test_get_artists_albums_bulk(plex_service, mock_plex_server):
     # Setup mock artists in cache
     artist1 = Mock(title="Artist1", genres=[])  # Initialize with empty list
     album1 = Mock(title="Album1", year=2020)
-    album1.tracks = Mock(return_value=["track1", "track2"])
+    album1.tracks = Mock(return_value=[Mock(ratingKey=11, title="Song 1"), Mock(ratingKey=12, title="Song 2")])
+    mock_server.return_value.fetchItem.return_value = artist1
 
     # Set up albums as a method that returns a list
     artist1.albums.return_value = [album1]
@@ -137,20 +162,51 @@ def test_get_artists_albums_bulk(plex_service, mock_plex_server):
     # Create a mock music library and add it to the service
     mock_music_library = Mock()
     mock_music_library.search = mock_library.search
-    plex_service._music_libraries = [mock_music_library]
-    plex_service._server = mock_server.return_value
-
-    # Add artist to cache
-    plex_service._artists_cache = {"1": Artist(id="1", name="Artist1", genres=["Rock"])}
+    use_library(
+        plex_service, mock_server.return_value, [mock_music_library], [Artist(id="1", name="Artist1", genres=["Rock"])]
+    )
 
     # Test album retrieval
-    albums = plex_service.get_artists_albums_bulk(["Artist1"])
+    albums = plex_service.get_artists_albums_bulk(["Artist1"], include_tracks=True)
 
     assert "Artist1" in albums
     assert len(albums["Artist1"]) == 1
     assert albums["Artist1"][0]["name"] == "Album1"
     assert albums["Artist1"][0]["year"] == 2020
     assert albums["Artist1"][0]["track_count"] == 2
+    assert albums["Artist1"][0]["tracks"][0] == {"rating_key": "11", "title": "Song 1"}
+    # Known artists are fetched by ratingKey rather than searched for by name
+    mock_server.return_value.fetchItem.assert_called_once_with(1)
+
+
+def test_get_artists_albums_bulk_uses_album_cache(plex_service, mock_plex_server):
+    """Test repeated album lookups for an unchanged artist skip Plex."""
+    mock_server, mock_library = mock_plex_server
+
+    artist1 = Mock(title="Artist1", updatedAt="2024-01-01")
+    album1 = Mock(title="Album1", year=2020)
+    album1.tracks = Mock(return_value=[Mock(ratingKey=11, title="Song 1"), Mock(ratingKey=12, title="Song 2")])
+    artist1.albums.return_value = [album1]
+    mock_server.return_value.fetchItem.return_value = artist1
+
+    mock_music_library = Mock()
+    mock_music_library.search = mock_library.search
+    artists = [Artist(id="1", name="Artist1", genres=["Rock"])]
+    use_library(plex_service, mock_server.return_value, [mock_music_library], artists)
+
+    first = plex_service.get_artists_albums_bulk(["Artist1"])
+    second = plex_service.get_artists_albums_bulk(["artist1"])
+
+    assert first == second
+    assert mock_server.return_value.fetchItem.call_count == 1
+    mock_library.search.assert_not_called()
+    assert artist1.albums.call_count == 1
+    assert plex_service.get_album_cache_stats()["hits"] == 1
+
+    # A newer updatedAt from a library reload invalidates the cached listing
+    use_library(plex_service, mock_server.return_value, [mock_music_library], artists, {"1": "2024-02-01"})
+    plex_service.get_artists_albums_bulk(["Artist1"])
+    assert artist1.albums.call_count == 2
 
 
 def test_create_curated_playlist(plex_service, mock_plex_server):
@@ -158,7 +214,7 @@ def test_create_curated_playlist(plex_service, mock_plex_server):
     mock_server, mock_library = mock_plex_server
 
     # Setup mock track
-    track1 = MagicMock()
+    track1 = MagicMock(ratingKey=11)
     track1.title = "Track1"
     track1.artist.return_value = MagicMock(title="Artist1")
 
@@ -167,10 +223,12 @@ def test_create_curated_playlist(plex_service, mock_plex_server):
     album.tracks.return_value = [track1]
 
     # Create artist with mock albums
-    search_result_artist = MagicMock()
+    search_result_artist = MagicMock(ratingKey=1)
     search_result_artist.title = "Artist1"
     search_result_artist.genres = []
     search_result_artist.albums.return_value = [album]
+    mock_server.return_value.fetchItem.return_value = search_result_artist
+    mock_server.return_value.fetchItems.return_value = [track1]
 
     # Setup mock searches - we need to handle different search scenarios
     def mock_search(*args, **kwargs):  # pylint: disable=unused-argument
@@ -188,13 +246,6 @@ def test_create_curated_playlist(plex_service, mock_plex_server):
 
     # Initialize plex service
     plex_service.initialize()
-
-    # Create a mock music library and add it to the service
-    mock_music_library = Mock()
-    mock_music_library.search = mock_library.search
-    plex_service._music_libraries = [mock_music_library]
-    plex_service._server = mock_server.return_value
-
     # Test playlist creation
     track_recommendations = [{"artist": "Artist1", "title": "Track1"}]
 
@@ -213,13 +264,6 @@ def test_create_curated_playlist_no_matches(plex_service, mock_plex_server):
 
     # Initialize plex service
     plex_service.initialize()
-
-    # Create a mock music library and add it to the service
-    mock_music_library = Mock()
-    mock_music_library.search = mock_library.search
-    plex_service._music_libraries = [mock_music_library]
-    plex_service._server = mock_server.return_value
-
     # Test playlist creation with no matches
     track_recommendations = [{"artist": "NonexistentArtist", "title": "NonexistentTrack"}]
 
@@ -232,7 +276,7 @@ def test_fuzzy_track_matching(plex_service, mock_plex_server):
     mock_server, mock_library = mock_plex_server
 
     # Setup mock track
-    track1 = MagicMock()
+    track1 = MagicMock(ratingKey=11)
     track1.title = "Track One (Live Version)"
     track1.artist.return_value = MagicMock(title="Artist1")
 
@@ -241,10 +285,12 @@ def test_fuzzy_track_matching(plex_service, mock_plex_server):
     album.tracks.return_value = [track1]
 
     # Create artist with mock albums
-    search_result_artist = MagicMock()
+    search_result_artist = MagicMock(ratingKey=1)
     search_result_artist.title = "Artist1"
     search_result_artist.genres = []
     search_result_artist.albums.return_value = [album]
+    mock_server.return_value.fetchItem.return_value = search_result_artist
+    mock_server.return_value.fetchItems.return_value = [track1]
 
     # Setup mock searches to handle both artist and track searches
     def mock_search(*args, **kwargs):  # pylint: disable=unused-argument
@@ -261,13 +307,6 @@ def test_fuzzy_track_matching(plex_service, mock_plex_server):
 
     # Initialize plex service
     plex_service.initialize()
-
-    # Create a mock music library and add it to the service
-    mock_music_library = Mock()
-    mock_music_library.search = mock_library.search
-    plex_service._music_libraries = [mock_music_library]
-    plex_service._server = mock_server.return_value
-
     # Test playlist creation with fuzzy matching
     track_recommendations = [{"artist": "Artist1", "title": "Track One"}]
 
@@ -275,3 +314,241 @@ def test_fuzzy_track_matching(plex_service, mock_plex_server):
 
     assert playlist is not None
     mock_server.return_value.createPlaylist.assert_called_once()
+
+
+def test_create_playlist_in_chunks(plex_service, mock_plex_server):
+    """Test large playlists are created with bounded add requests."""
+    mock_server, _ = mock_plex_server
+    use_library(plex_service, mock_server.return_value)
+    playlist = MagicMock()
+    mock_server.return_value.createPlaylist.return_value = playlist
+
+    tracks = [Mock(ratingKey=i) for i in range(5)]
+    result = plex_service.create_playlist("Big Playlist", tracks, chunk_size=2)
+
+    assert result is playlist
+    mock_server.return_value.createPlaylist.assert_called_once_with("Big Playlist", items=tracks[:2])
+    assert [call.args[0] for call in playlist.addItems.call_args_list] == [tracks[2:4], tracks[4:]]
+
+
+def test_sync_playlist_applies_diff(plex_service, mock_plex_server):
+    """Test syncing an existing playlist only adds and removes the difference."""
+    mock_server, _ = mock_plex_server
+    use_library(plex_service, mock_server.return_value)
+
+    kept = Mock(ratingKey=1)
+    stale = Mock(ratingKey=2)
+    new = Mock(ratingKey=3)
+    playlist = MagicMock(title="Existing", TYPE="playlist")
+    playlist.items.return_value = [kept, stale]
+    mock_server.return_value.fetchItem.return_value = playlist
+
+    result, added, removed = plex_service.sync_playlist("42", [Mock(ratingKey=1), new, Mock(ratingKey=3)])
+
+    assert result is playlist
+    assert (added, removed) == (1, 1)
+    mock_server.return_value.fetchItem.assert_called_once_with(42)
+    playlist.removeItems.assert_called_once_with([stale])
+    playlist.addItems.assert_called_once_with([new])
+
+
+def test_match_tracks_by_rating_key(plex_service, mock_plex_server):
+    """Test grounded recommendations resolve by rating key without fuzzy or global search."""
+    mock_server, mock_library = mock_plex_server
+
+    track1 = MagicMock(ratingKey=101)
+    track1.title = "Song A"
+    track2 = MagicMock(ratingKey=102)
+    track2.title = "Song B"
+    album = MagicMock()
+    album.tracks.return_value = [track1, track2]
+    artist = MagicMock(title="Artist1")
+    artist.albums.return_value = [album]
+    mock_library.search.side_effect = lambda *args, **kwargs: [artist] if kwargs.get("libtype") == "artist" else []
+
+    mock_music_library = Mock()
+    mock_music_library.search = mock_library.search
+    use_library(plex_service, mock_server.return_value, [mock_music_library])
+    mock_server.return_value.fetchItems.return_value = [track1, track2]
+
+    matched = plex_service.match_tracks(
+        [
+            {"artist": "Artist1", "title": "Renamed", "rating_key": "102"},
+            {"artist": "Artist1", "title": "Song A", "rating_key": "101"},
+        ]
+    )
+
+    assert matched == [track2, track1]
+    mock_server.return_value.fetchItems.assert_called_once_with("/library/metadata/102,101")
+    stats = plex_service.get_match_stats()
+    assert stats["id_hits"] == 2
+    assert stats["fallback_searches"] == 0
+    assert stats["hit_rate"] == 1.0
+
+
+def test_sync_playlist_rejects_missing_or_wrong_item(plex_service, mock_plex_server):
+    """Test syncing fails clearly when the ratingKey is missing or not a playlist."""
+    mock_server, _ = mock_plex_server
+    use_library(plex_service, mock_server.return_value)
+
+    mock_server.return_value.fetchItem.side_effect = NotFound("missing")
+    with pytest.raises(PlaylistNotFoundError):
+        plex_service.sync_playlist("42", [Mock(ratingKey=1)])
+
+    mock_server.return_value.fetchItem.side_effect = None
+    mock_server.return_value.fetchItem.return_value = MagicMock(TYPE="track")
+    with pytest.raises(NotAPlaylistError):
+        plex_service.sync_playlist("42", [Mock(ratingKey=1)])
+
+
+def test_get_artist_albums_skips_removed_artist(plex_service, mock_plex_server):
+    """Test a cached artist that no longer exists in Plex is reported as not found."""
+    mock_server, mock_library = mock_plex_server
+    use_library(plex_service, mock_server.return_value, artists=[Artist(id="1", name="Artist1", genres=[])])
+    mock_server.return_value.fetchItem.side_effect = NotFound("gone")
+
+    assert plex_service.get_artist_albums("Artist1") is None
+    mock_library.search.assert_not_called()
+
+
+def test_initialize_shares_catalog_between_workers(tmp_path, mock_plex_server):
+    """Test a second worker loads the stored catalog instead of scanning an unchanged library."""
+    mock_server, mock_library = mock_plex_server
+    section = mock_server.return_value.library.sections.return_value[0]
+    section.key, section.updatedAt, section.totalSize = 1, "2024-01-01", 1
+    mock_library.search.return_value = [Mock(ratingKey="1", title="Artist1", genres=[], updatedAt="2024-01-01")]
+    store = CatalogStore(str(tmp_path))
+
+    leader = PlexService("http://localhost:32400", "fake_token", catalog_store=store)
+    leader.initialize()
+    follower = PlexService("http://localhost:32400", "fake_token", catalog_store=store)
+    follower.initialize()
+
+    assert mock_library.search.call_count == 1
+    assert [a.name for a in follower.get_all_artists()] == ["Artist1"]
+    assert follower.catalog_version == leader.catalog_version
+    assert dict(follower._snapshot.updated_at) == {"1": "2024-01-01"}
+
+    # A refresh published by the leader is picked up by the follower
+    section.totalSize = 2
+    mock_library.search.return_value.append(Mock(ratingKey="2", title="Artist2", genres=[], updatedAt=None))
+    leader.initialize()
+    follower._catalog_checked_at = 0.0
+    assert sorted(a.name for a in follower.get_all_artists()) == ["Artist1", "Artist2"]
+
+
+def test_genre_index_follows_artist_cache(plex_service):
+    """Test genre queries reflect the current artist cache after it is replaced."""
+    use_library(plex_service, artists=[Artist(id="1", name="Artist1", genres=["Rock"])])
+    assert [a.name for a in plex_service.get_artists_by_genres(["rock"])] == ["Artist1"]
+
+    use_library(plex_service, artists=[Artist(id="2", name="Artist2", genres=["Rock"])])
+    assert [a.name for a in plex_service.get_artists_by_genres(["rock"])] == ["Artist2"]
+    assert plex_service.get_genres() == [{"name": "Rock", "count": 1}]
+
+
+def test_match_tracks_memoizes_hits_and_misses(plex_service, mock_plex_server):
+    """Test repeated recommendations resolve from the memo without Plex lookups or global searches."""
+    mock_server, mock_library = mock_plex_server
+    track = MagicMock(ratingKey=101)
+    track.title = "Song A"
+    album = MagicMock()
+    album.tracks.return_value = [track]
+    artist = MagicMock(title="Artist1")
+    artist.albums.return_value = [album]
+    mock_library.search.side_effect = lambda *args, **kwargs: [artist] if kwargs.get("libtype") == "artist" else []
+    mock_music_library = Mock()
+    mock_music_library.search = mock_library.search
+    use_library(plex_service, mock_server.return_value, [mock_music_library])
+    mock_server.return_value.fetchItems.return_value = [track]
+
+    recommendations = [{"artist": "Artist1", "title": "Song A"}, {"artist": "Artist1", "title": "Invented"}]
+    assert plex_service.match_tracks(recommendations) == [track]
+    searches = mock_library.search.call_count
+
+    assert plex_service.match_tracks(recommendations) == [track]
+    assert mock_library.search.call_count == searches
+    stats = plex_service.get_match_stats()
+    assert stats["memo_hits"] == 1
+    assert stats["known_misses"] == 1
+    assert stats["fallback_searches"] == 1
+
+
+def test_fill_tracks_ranks_locally_and_caps_artists(plex_service, mock_plex_server):
+    """Test top-up prefers the chosen track's album, skips chosen tracks and respects the per-artist cap."""
+    mock_server, _ = mock_plex_server
+    use_library(
+        plex_service,
+        mock_server.return_value,
+        artists=[Artist(id="1", name="Artist1", genres=["Rock"]), Artist(id="2", name="Artist2", genres=["Jazz"])],
+    )
+    albums = {
+        "1": [
+            {"name": "Same", "year": 2020, "tracks": [CachedTrack("10", "Chosen"), CachedTrack("11", "Sibling")]},
+            {"name": "Other", "year": 2021, "tracks": [CachedTrack("12", "Hit", rating=10.0, plays=50)]},
+        ],
+        "2": [{"name": "Jazz", "year": 2019, "tracks": [CachedTrack("20", "Tune", rating=8.0)]}],
+    }
+    for artist_id, listing in albums.items():
+        plex_service._album_cache.put(artist_id, listing, 1)
+    mock_server.return_value.fetchItems.side_effect = lambda path: [
+        Mock(ratingKey=key) for key in path.rsplit("/", 1)[1].split(",")
+    ]
+    chosen = Mock(ratingKey="10", grandparentTitle="Artist1")
+
+    filled = plex_service.fill_tracks([chosen], ["Artist1", "Artist2"], min_tracks=4, max_per_artist=2)
+
+    assert [track.ratingKey for track in filled] == ["11", "20"]
+
+
+def test_readers_keep_their_snapshot_across_refresh(tmp_path, mock_plex_server):
+    """Test a published refresh does not change a reader's snapshot, and a stale catalog cannot replace a newer one."""
+    mock_server, mock_library = mock_plex_server
+    mock_library.search.return_value = [Mock(ratingKey="1", title="Artist1", genres=[], updatedAt=None)]
+    service = PlexService("http://localhost:32400", "fake_token", catalog_store=CatalogStore(str(tmp_path)))
+    service.initialize()
+    before = service._snapshot
+
+    mock_library.search.return_value = [Mock(ratingKey="2", title="Artist2", genres=[], updatedAt=None)]
+    mock_server.return_value.library.sections.return_value[0].totalSize = 2
+    service.initialize()
+
+    assert [a.name for a in before.artists.values()] == ["Artist1"]
+    assert [a.name for a in service.get_all_artists()] == ["Artist2"]
+    assert not service._publish(LibrarySnapshot(fingerprint="stale"), replaces=before)
+    assert service.library_fingerprint != "stale"
+
+
+def test_requests_before_load_do_not_connect(plex_service, mock_plex_server):
+    """Test request paths fail clearly instead of connecting lazily before the library is loaded."""
+    mock_server, _ = mock_plex_server
+
+    with pytest.raises(LibraryNotLoadedError):
+        plex_service.create_playlist("Playlist", [Mock()])
+    mock_server.assert_not_called()
+    assert plex_service.machine_identifier is None
+
+
+def test_prefetch_warms_album_cache_and_reports_hit_rate(plex_service, mock_plex_server):
+    """Test prefetching fills the album cache, stops when asked and counts warmed artists that were selected."""
+    mock_server, _ = mock_plex_server
+    artist = MagicMock(title="Artist1")
+    artist.albums.return_value = [MagicMock(title="Album", year=2020, tracks=Mock(return_value=[]))]
+    mock_server.return_value.fetchItem.return_value = artist
+    use_library(
+        plex_service,
+        mock_server.return_value,
+        artists=[Artist(id="1", name="Artist1"), Artist(id="2", name="Artist2")],
+    )
+    stop = threading.Event()
+    stop.set()
+
+    assert plex_service.prefetch_albums(["Artist1", "Artist2"], stop) == []
+    assert plex_service.prefetch_albums(["Artist1", "Unknown"]) == ["Artist1"]
+    plex_service.get_artists_albums_bulk(["Artist1"])
+    assert mock_server.return_value.fetchItem.call_count == 1
+
+    plex_service.record_prefetch(["Artist1", "Unknown"], ["Artist1"], ["artist1", "Artist2"])
+    stats = plex_service.get_prefetch_stats()
+    assert stats["hit_rate"] == 1.0
+    assert stats["coverage"] == 0.5
@@ -0,0 +1,90 @@
+"""Tests for the request profiler."""
+
+import asyncio
+import threading
+import time
+import tracemalloc
+
+from app.models import Artist
+from app.services.library_snapshot import LibrarySnapshot
+from app.services.profiler import TRACEMALLOC_FRAMES, RequestProfiler, memory_snapshot, span, traced
+
+
+def test_slow_requests_are_captured_with_spans():
+    """Test requests over the threshold keep their span timeline, including spans run in worker threads."""
+    profiler = RequestProfiler(slow_threshold=0.01)
+
+    async def handle():
+        with profiler.trace("recommendations") as trace:
+            with span("plex:get_all_artists"):
+                pass
+            await asyncio.to_thread(traced("llm:call", time.sleep), 0.02)
+        return trace
+
+    trace = asyncio.run(handle())
+    capture = profiler.get_capture(trace.id)
+
+    assert [s["name"] for s in capture["spans"]] == ["plex:get_all_artists", "llm:call"]
+    assert capture["spans"][1]["duration"] >= 0.02
+    assert capture["profile"] is None
+
+
+def test_fast_unsampled_requests_are_not_captured():
+    """Test fast requests are not kept unless they were profiled."""
+    profiler = RequestProfiler(slow_threshold=60)
+    with profiler.trace("recommendations"):
+        with span("plex:match_tracks"):
+            pass
+    assert not profiler.list_captures()
+
+    with profiler.trace("recommendations", force_profile=True) as trace:
+        traced("plex:match_tracks", sorted)([3, 1, 2])
+    capture = profiler.get_capture(trace.id)
+    assert capture["profiled"]
+    assert "sorted" in capture["profile"]
+
+
+def test_concurrent_spans_profile_one_at_a_time():
+    """Test spans running at once in different threads are all timed but only one of them is profiled."""
+    profiler = RequestProfiler()
+    barrier = threading.Barrier(2)
+
+    async def handle():
+        with profiler.trace("recommendations", force_profile=True) as trace:
+            await asyncio.gather(
+                asyncio.to_thread(traced("llm:call", barrier.wait)),
+                asyncio.to_thread(traced("plex:call", barrier.wait)),
+            )
+        return trace
+
+    trace = asyncio.run(handle())
+
+    assert sorted(s["name"] for s in trace.spans) == ["llm:call", "plex:call"]
+    assert len(trace._profiles) == 1  # pylint: disable=protected-access
+    assert trace.profile_text() is not None
+
+
+def test_memory_snapshot():
+    """Test the memory snapshot reports whether tracing is on."""
+    assert memory_snapshot() == {"tracing": False}
+    tracemalloc.start()
+    try:
+        snapshot = memory_snapshot(limit=5)
+    finally:
+        tracemalloc.stop()
+    assert snapshot["tracing"]
+    assert len(snapshot["top"]) <= 5
+
+
+def test_memory_snapshot_attributes_cache_allocations():
+    """Test memory allocated while building the library snapshot counts towards the caches."""
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        library = LibrarySnapshot(
+            artists={str(i): Artist(id=str(i), name=f"Artist {i}", genres=["Jazz"]) for i in range(200)}
+        )
+        snapshot = memory_snapshot()
+    finally:
+        tracemalloc.stop()
+    assert library.find_artist("Artist 1") is not None
+    assert snapshot["cache_bytes"] > 0
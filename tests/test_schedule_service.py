@@ -0,0 +1,126 @@
+"""Tests for the schedule service."""
+
+# pylint: disable=redefined-outer-name
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock
+
+import pytest  # pylint: disable=import-error
+
+from app.models import PlaylistResponse, ScheduleRequest
+from app.services.schedule_service import JITTER_FRACTION, ScheduleBusyError, ScheduleService
+
+
+@pytest.fixture
+def run_playlist():
+    """Fixture to mock the playlist pipeline."""
+    return AsyncMock(return_value=PlaylistResponse(name="Nightly", track_count=1, tracks=[], id="99"))
+
+
+@pytest.fixture
+def get_fingerprint():
+    """Fixture to mock the library fingerprint."""
+    return Mock(return_value="fp-1")
+
+
+@pytest.fixture
+def schedule_service(tmp_path, run_playlist, get_fingerprint):
+    """Fixture to create a ScheduleService backed by a temporary file."""
+    return ScheduleService(str(tmp_path / "schedules.json"), run_playlist, get_fingerprint)
+
+
+def test_add_schedule_persists(schedule_service, run_playlist, get_fingerprint):
+    """Test schedules survive a reload from disk and first runs fall within the interval."""
+    schedule = schedule_service.add_schedule(ScheduleRequest(prompt="Night drive", interval_hours=1))
+    assert time.time() <= schedule.next_run_at <= time.time() + 3600
+
+    reloaded = ScheduleService(schedule_service.path, run_playlist, get_fingerprint)
+    reloaded.load()
+    assert [s.prompt for s in reloaded.list_schedules()] == ["Night drive"]
+
+
+def test_run_schedule_writes_back_to_playlist(schedule_service, run_playlist):
+    """Test the first run records the created playlist and later runs target it."""
+    schedule = schedule_service.add_schedule(ScheduleRequest(prompt="Night drive"))
+
+    asyncio.run(schedule_service.run_schedule(schedule, force=True))
+    assert schedule.playlist_id == "99"
+    assert schedule.last_status == "success"
+    assert schedule.next_run_at >= time.time() + 24 * 3600 - 5
+    assert schedule.next_run_at <= time.time() + 24 * 3600 * (1 + JITTER_FRACTION)
+
+    asyncio.run(schedule_service.run_schedule(schedule, force=True))
+    assert run_playlist.call_args.args[0].playlist_id == "99"
+    assert run_playlist.call_args.args[1] == "fp-1"
+    assert schedule_service.get_schedule(schedule.id).playlist_id == "99"
+
+
+def test_run_schedule_skips_unchanged_library(schedule_service, run_playlist, get_fingerprint):
+    """Test a run is skipped when the library fingerprint has not changed."""
+    schedule = schedule_service.add_schedule(ScheduleRequest(prompt="Night drive"))
+    asyncio.run(schedule_service.run_schedule(schedule))
+    asyncio.run(schedule_service.run_schedule(schedule))
+
+    assert run_playlist.call_count == 1
+    assert schedule.last_status == "skipped"
+
+    get_fingerprint.return_value = "fp-2"
+    asyncio.run(schedule_service.run_schedule(schedule))
+    assert run_playlist.call_count == 2
+
+
+def test_run_due_records_errors(schedule_service, run_playlist):
+    """Test only due schedules run and failures are recorded on the schedule."""
+    due = schedule_service.add_schedule(ScheduleRequest(prompt="Due"))
+    later = schedule_service.add_schedule(ScheduleRequest(prompt="Later"))
+    due.next_run_at = time.time() - 1
+    later.next_run_at = time.time() + 3600
+    schedule_service._store(due)  # pylint: disable=protected-access
+    schedule_service._store(later)  # pylint: disable=protected-access
+    run_playlist.side_effect = Exception("LLM error")
+
+    asyncio.run(schedule_service.run_due())
+
+    assert run_playlist.call_count == 1
+    assert schedule_service.get_schedule(due.id).last_status == "error"
+    assert schedule_service.get_schedule(due.id).last_error == "LLM error"
+    assert schedule_service.get_schedule(later.id).last_status is None
+
+
+def test_workers_share_registry(schedule_service, run_playlist, get_fingerprint):
+    """Test a schedule added by one worker is seen and removable by another."""
+    other = ScheduleService(schedule_service.path, run_playlist, get_fingerprint)
+    schedule = schedule_service.add_schedule(ScheduleRequest(prompt="Night drive"))
+
+    assert other.get_schedule(schedule.id) is not None
+    assert other.remove_schedule(schedule.id)
+    assert schedule_service.list_schedules() == []
+
+
+def test_run_schedule_rejects_overlapping_runs(schedule_service, run_playlist):
+    """Test a schedule cannot be run again while a run is in flight."""
+    schedule = schedule_service.add_schedule(ScheduleRequest(prompt="Night drive"))
+
+    async def overlap(request, fingerprint):  # pylint: disable=unused-argument
+        with pytest.raises(ScheduleBusyError):
+            await schedule_service.run_schedule(schedule, force=True)
+        return PlaylistResponse(name="Nightly", track_count=1, tracks=[], id="99")
+
+    run_playlist.side_effect = overlap
+    asyncio.run(schedule_service.run_schedule(schedule, force=True))
+
+    assert run_playlist.call_count == 1
+    assert schedule.last_status == "success"
+
+
+def test_only_one_worker_leads(schedule_service, run_playlist, get_fingerprint):
+    """Test the scheduler leader lock is held by a single worker until it stops."""
+    other = ScheduleService(schedule_service.path, run_playlist, get_fingerprint)
+
+    assert schedule_service._try_become_leader()  # pylint: disable=protected-access
+    assert not other._try_become_leader()  # pylint: disable=protected-access
+
+    asyncio.run(schedule_service.stop())
+    assert other._try_become_leader()  # pylint: disable=protected-access
+    asyncio.run(other.stop())